@@ -0,0 +1,204 @@
+from bisect import bisect_right
+import numpy as np
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+# chunk_id = frame_id * FRAGS_PER_FRAME + frag_index (see FrameFragmenter)
+FRAGS_PER_FRAME = 1000
+# Frames kept in the ring; larger than the broadcaster's 1000-frame cleanup window
+RING_FRAMES = 1024
+
+class ChunkStore:
+    """
+    Dict-like seq -> payload store for P2PNode, organised as a ring of frame slots.
+    Slot frame_id % RING_FRAMES holds (frame_id, [payload or None per fragment]).
+    Storing a chunk of a newer frame into an occupied slot evicts the older frame;
+    evicted seqs are reported through on_evict so the caller can drop them from its bitmap.
+    """
+    def __init__(self, on_evict: Optional[Callable[[List[int]], None]] = None):
+        self._ring: List[Optional[tuple]] = [None] * RING_FRAMES
+        self._len = 0
+        self.on_evict = on_evict
+
+    def _row(self, seq: int):
+        frame_id, frag = divmod(seq, FRAGS_PER_FRAME)
+        slot = self._ring[frame_id % RING_FRAMES]
+        if slot is None or slot[0] != frame_id:
+            return None, frag
+        return slot[1], frag
+
+    def __setitem__(self, seq: int, payload: bytes):
+        frame_id, frag = divmod(seq, FRAGS_PER_FRAME)
+        idx = frame_id % RING_FRAMES
+        slot = self._ring[idx]
+        if slot is None or slot[0] != frame_id:
+            if slot is not None:
+                if frame_id < slot[0]:
+                    # Older than everything the ring still holds: nothing to keep it in
+                    if self.on_evict:
+                        self.on_evict([seq])
+                    return
+                self._evict(idx)
+            slot = self._ring[idx] = (frame_id, [])
+        row = slot[1]
+        if frag >= len(row):
+            row.extend([None] * (frag + 1 - len(row)))
+        if row[frag] is None:
+            self._len += 1
+        row[frag] = payload
+
+    def _evict(self, idx: int):
+        frame_id, row = self._ring[idx]
+        self._ring[idx] = None
+        base = frame_id * FRAGS_PER_FRAME
+        evicted = [base + i for i, p in enumerate(row) if p is not None]
+        self._len -= len(evicted)
+        if evicted and self.on_evict:
+            self.on_evict(evicted)
+
+    def __getitem__(self, seq: int) -> bytes:
+        row, frag = self._row(seq)
+        if row is None or frag >= len(row) or row[frag] is None:
+            raise KeyError(seq)
+        return row[frag]
+
+    def get(self, seq: int, default=None):
+        row, frag = self._row(seq)
+        if row is None or frag >= len(row) or row[frag] is None:
+            return default
+        return row[frag]
+
+    def __contains__(self, seq) -> bool:
+        row, frag = self._row(seq)
+        return row is not None and frag < len(row) and row[frag] is not None
+
+    def pop(self, seq: int, *default):
+        row, frag = self._row(seq)
+        if row is None or frag >= len(row) or row[frag] is None:
+            if default:
+                return default[0]
+            raise KeyError(seq)
+        payload = row[frag]
+        row[frag] = None
+        self._len -= 1
+        return payload
+
+    def __delitem__(self, seq: int):
+        self.pop(seq)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self) -> Iterator[int]:
+        for slot in self._ring:
+            if slot is None:
+                continue
+            base = slot[0] * FRAGS_PER_FRAME
+            for i, p in enumerate(slot[1]):
+                if p is not None:
+                    yield base + i
+
+    def keys(self) -> Iterator[int]:
+        return iter(self)
+
+class ChunkSet(set):
+    """
+    Set of chunk ids that also keeps its contents as sorted, disjoint [start, end] runs,
+    updated incrementally, so the BITMAP ranges never need a full sort.
+    Only add/discard/remove/update/difference_update/clear maintain the runs; use those.
+    """
+    def __init__(self, iterable: Iterable[int] = ()):
+        super().__init__(iterable)
+        self._starts: List[int] = []
+        self._ends: List[int] = []
+        if self:
+            # Bulk build: sort once and split at the gaps, in numpy
+            arr = np.fromiter(self, dtype=np.int64, count=len(self))
+            arr.sort()
+            breaks = np.flatnonzero(np.diff(arr) != 1)
+            self._starts = np.concatenate((arr[:1], arr[breaks + 1])).tolist()
+            self._ends = np.concatenate((arr[breaks], arr[-1:])).tolist()
+
+    def add(self, x: int):
+        if x in self:
+            return
+        super().add(x)
+        starts, ends = self._starts, self._ends
+        i = bisect_right(starts, x) - 1
+        joins_left = i >= 0 and ends[i] == x - 1
+        joins_right = i + 1 < len(starts) and starts[i + 1] == x + 1
+        if joins_left and joins_right:
+            ends[i] = ends[i + 1]
+            del starts[i + 1]
+            del ends[i + 1]
+        elif joins_left:
+            ends[i] = x
+        elif joins_right:
+            starts[i + 1] = x
+        else:
+            starts.insert(i + 1, x)
+            ends.insert(i + 1, x)
+
+    def discard(self, x: int):
+        if x not in self:
+            return
+        super().discard(x)
+        starts, ends = self._starts, self._ends
+        i = bisect_right(starts, x) - 1
+        start, end = starts[i], ends[i]
+        if start == end:
+            del starts[i]
+            del ends[i]
+        elif x == start:
+            starts[i] = x + 1
+        elif x == end:
+            ends[i] = x - 1
+        else:
+            ends[i] = x - 1
+            starts.insert(i + 1, x + 1)
+            ends.insert(i + 1, end)
+
+    def remove(self, x: int):
+        if x not in self:
+            raise KeyError(x)
+        self.discard(x)
+
+    def update(self, *iterables):
+        for it in iterables:
+            for x in it:
+                self.add(x)
+
+    def difference_update(self, *iterables):
+        for it in iterables:
+            for x in it:
+                self.discard(x)
+
+    def clear(self):
+        super().clear()
+        self._starts.clear()
+        self._ends.clear()
+
+    def ranges(self) -> List[Tuple[int, int]]:
+        """
+        Sorted inclusive (start, end) runs.
+        """
+        return list(zip(self._starts, self._ends))
+
+    def words_in_range(self, base: int, nwords: int) -> np.ndarray:
+        """
+        Packed little-endian uint64 words for ids [base, base + 64 * nwords), same layout
+        as PeerBitmap.words_in_range. base must be 64-aligned.
+        """
+        end = base + nwords * 64
+        bits = np.zeros(nwords * 64, dtype=np.uint8)
+        starts, ends = self._starts, self._ends
+        i = bisect_right(ends, base - 1)
+        while i < len(starts) and starts[i] < end:
+            bits[max(starts[i], base) - base:min(ends[i] + 1, end) - base] = 1
+            i += 1
+        return np.packbits(bits, bitorder='little').view('<u8')
+
+    def min(self) -> int:
+        return self._starts[0]
+
+    def max(self) -> int:
+        return self._ends[-1]
@@ -1,29 +1,103 @@
 from aiohttp import web
+import asyncio
+import atexit
+import copy
+import gzip
 import json
 import logging
+import os
+import shutil
+import tempfile
+import time
+from typing import Optional
 from stats_manager import StatsManager
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
+_stats = StatsManager()
+
 # ==========================================
-# VIEWER DASHBOARD (Local Stats Focus)
+# SHARED PAGE SKELETON
 # ==========================================
-VIEWER_HTML = """
+# Both dashboards share the page skeleton and the stats client; each page
+# only supplies its title, style, body markup and render script.
+_BASE_HTML = """
 <!DOCTYPE html>
 <html>
 <head>
-    <title>P2P Viewer Node (Local Stats)</title>
-    <style>
+    <meta charset="utf-8">
+    <title>{title}</title>
+    <style>{style}
+    </style>
+    <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
+</head>
+<body>{body}
+    <script>{script}{stats_client}
+    </script>
+</body>
+</html>
+"""
+
+_STATS_CLIENT_JS = """
+        // Stats are pushed by the server once per second; /api/stats is only used for the first paint.
+        // The socket sends a full snapshot first, then deltas holding only the changed keys.
+        const utf8 = new TextDecoder();
+        let pushedStats = {};
+        function applyStats(msg) {
+            if (msg.type === 'full') {
+                pushedStats = msg.data;
+            } else {
+                const delta = msg.data;
+                if (delta.global_stats) {
+                    const g = pushedStats.global_stats || (pushedStats.global_stats = {});
+                    Object.entries(delta.global_stats).forEach(([addr, s]) => {
+                        if (s === null) delete g[addr]; else g[addr] = s;
+                    });
+                    delete delta.global_stats;
+                }
+                Object.assign(pushedStats, delta);
+            }
+            scheduleRender(pushedStats);
+        }
+        // All DOM and chart writes happen in one animation frame; messages that
+        // arrive before the frame runs are coalesced into a single render.
+        let pendingStats = null;
+        function scheduleRender(data) {
+            if (pendingStats === null) {
+                requestAnimationFrame(() => {
+                    const latest = pendingStats;
+                    pendingStats = null;
+                    updateStats(latest);
+                });
+            }
+            pendingStats = data;
+        }
+        function connectStats() {
+            const ws = new WebSocket((location.protocol === 'https:' ? 'wss://' : 'ws://') + location.host + '/ws/stats');
+            ws.binaryType = 'arraybuffer';
+            ws.onmessage = e => applyStats(JSON.parse(utf8.decode(e.data)));
+            ws.onclose = () => setTimeout(connectStats, 1000);
+        }
+        fetch('/api/stats').then(response => response.json()).then(scheduleRender);
+        connectStats();"""
+
+# ==========================================
+# VIEWER DASHBOARD (Local Stats Focus)
+# ==========================================
+VIEWER_STYLE = """
         body { background-color: #1e1e1e; color: #00ff00; font-family: monospace; padding: 20px; }
         .card { border: 1px solid #333; padding: 15px; margin-bottom: 20px; border-radius: 5px; background: #252526; }
         h1, h2, h3 { color: #00ff00; text-shadow: 0 0 5px #00ff00; }
         .stat-value { font-size: 1.5em; font-weight: bold; }
         ul { list-style-type: none; padding: 0; }
-        li { padding: 5px 0; border-bottom: 1px solid #333; }
-    </style>
-    <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
-</head>
-<body>
+        li { padding: 5px 0; border-bottom: 1px solid #333; }"""
+
+VIEWER_BODY = """
     <h1>P2P Viewer Node</h1>
     
     <div class="card">
@@ -52,16 +126,16 @@ VIEWER_HTML = """
     <div class="card">
         <h2>My Source Distribution (Last 10s)</h2>
         <div style="width: 300px; height: 300px;">
-            <canvas id="recentSourceChart"></canvas>
+            <canvas id="recentSourceChart" width="300" height="300"></canvas>
         </div>
     </div>
+"""
 
-    <script>
+VIEWER_SCRIPT = """
         const ctx = document.getElementById('trafficChart').getContext('2d');
         const trafficChart = new Chart(ctx, {
             type: 'line',
             data: {
-                labels: [],
                 datasets: [{
                     label: 'Download (KB/s)',
                     borderColor: '#00ff00',
@@ -75,73 +149,101 @@ VIEWER_HTML = """
                 }]
             },
             options: {
-                scales: { x: { display: false }, y: { beginAtZero: true } },
+                parsing: false, // data is pre-built {x, y} points
+                normalized: true,
+                scales: { x: { type: 'linear', display: false }, y: { beginAtZero: true } },
                 elements: { point: { radius: 0 } },
+                plugins: { decimation: { enabled: true, algorithm: 'min-max' } },
                 animation: false
             }
         });
 
+        // Fixed-size ring buffers for the traffic chart (no per-tick Array.shift)
+        const TRAFFIC_POINTS = 50;
+        const dlRing = new Float32Array(TRAFFIC_POINTS);
+        const ulRing = new Float32Array(TRAFFIC_POINTS);
+        let trafficCount = 0;
+
+        // Oldest-to-newest view of a ring, x = sample number
+        function ringToPoints(ring) {
+            const n = Math.min(trafficCount, TRAFFIC_POINTS);
+            const first = trafficCount - n;
+            const points = new Array(n);
+            for (let k = 0; k < n; k++) {
+                const seq = first + k;
+                points[k] = { x: seq, y: ring[seq % TRAFFIC_POINTS] };
+            }
+            return points;
+        }
+
         const ctxRecent = document.getElementById('recentSourceChart').getContext('2d');
         const recentChart = new Chart(ctxRecent, {
             type: 'pie',
             data: { labels: [], datasets: [{ data: [], backgroundColor: ['#ff6384', '#36a2eb', '#cc65fe', '#ffce56', '#4bc0c0'] }] },
-            options: { responsive: true, plugins: { legend: { position: 'right' } } }
+            // Fixed-size container: no ResizeObserver, and only clicks (legend toggles) are handled
+            options: { responsive: false, maintainAspectRatio: false, animation: false, events: ['click'], plugins: { legend: { position: 'right' } } }
         });
 
-        function updateStats() {
-            fetch('/api/stats')
-                .then(response => response.json())
-                .then(data => {
-                    document.getElementById('uptime').textContent = data.uptime;
-                    document.getElementById('upload_rate').textContent = (data.upload_rate / 1024).toFixed(1);
-                    document.getElementById('download_rate').textContent = (data.download_rate / 1024).toFixed(1);
-                    document.getElementById('total_upload').textContent = (data.total_upload / 1024 / 1024).toFixed(2);
-                    document.getElementById('total_download').textContent = (data.total_download / 1024 / 1024).toFixed(2);
-                    document.getElementById('peer_count').textContent = data.peer_count;
-                    document.getElementById('buffer_health').textContent = data.buffer_health;
-                    document.getElementById('avg_rtt_display').textContent = data.avg_rtt ? data.avg_rtt : 0;
-
-                    const peerList = document.getElementById('peer_list');
-                    peerList.innerHTML = '';
-                    data.active_peers.forEach(peer => {
-                        const li = document.createElement('li');
-                        li.textContent = peer;
-                        peerList.appendChild(li);
-                    });
+        let recentChartKey = null;
 
-                    if (trafficChart.data.labels.length > 50) {
-                        trafficChart.data.labels.shift();
-                        trafficChart.data.datasets[0].data.shift();
-                        trafficChart.data.datasets[1].data.shift();
-                    }
-                    trafficChart.data.labels.push(new Date().toLocaleTimeString());
-                    trafficChart.data.datasets[0].data.push(data.download_rate / 1024);
-                    trafficChart.data.datasets[1].data.push(data.upload_rate / 1024);
-                    trafficChart.update();
-
-                    // Update Recent Chart
-                    if (data.source_distribution_10s) {
-                        recentChart.data.labels = Object.keys(data.source_distribution_10s);
-                        recentChart.data.datasets[0].data = Object.values(data.source_distribution_10s).map(v => (v/1024).toFixed(2));
-                        recentChart.update();
-                    }
-                });
+        // Element handles, resolved once
+        const el = {};
+        ['uptime', 'upload_rate', 'download_rate', 'total_upload', 'total_download',
+         'peer_count', 'buffer_health', 'avg_rtt_display', 'peer_list'].forEach(id => { el[id] = document.getElementById(id); });
+
+        function updateStats(data) {
+            el.uptime.textContent = data.uptime;
+            el.upload_rate.textContent = (data.upload_rate / 1024).toFixed(1);
+            el.download_rate.textContent = (data.download_rate / 1024).toFixed(1);
+            el.total_upload.textContent = (data.total_upload / 1024 / 1024).toFixed(2);
+            el.total_download.textContent = (data.total_download / 1024 / 1024).toFixed(2);
+            el.peer_count.textContent = data.peer_count;
+            el.buffer_health.textContent = data.buffer_health;
+            el.avg_rtt_display.textContent = data.avg_rtt ? data.avg_rtt : 0;
+
+            const peerList = el.peer_list;
+            peerList.innerHTML = '';
+            data.active_peers.forEach(peer => {
+                const li = document.createElement('li');
+                li.textContent = peer;
+                peerList.appendChild(li);
+            });
+
+            const slot = trafficCount % TRAFFIC_POINTS;
+            dlRing[slot] = data.download_rate / 1024;
+            ulRing[slot] = data.upload_rate / 1024;
+            trafficCount++;
+            trafficChart.data.datasets[0].data = ringToPoints(dlRing);
+            trafficChart.data.datasets[1].data = ringToPoints(ulRing);
+            trafficChart.update('none');
+
+            // Update Recent Chart (skip the redraw when nothing changed)
+            if (data.source_distribution_10s) {
+                const labels = Object.keys(data.source_distribution_10s);
+                const values = Object.values(data.source_distribution_10s).map(v => (v/1024).toFixed(2));
+                const key = JSON.stringify([labels, values]);
+                if (key !== recentChartKey) {
+                    recentChartKey = key;
+                    recentChart.data.labels = labels;
+                    recentChart.data.datasets[0].data = values;
+                    recentChart.update('none');
+                }
+            }
         }
-        setInterval(updateStats, 1000);
-    </script>
-</body>
-</html>
 """
 
+VIEWER_HTML = _BASE_HTML.format(
+    title="P2P Viewer Node (Local Stats)",
+    style=VIEWER_STYLE,
+    body=VIEWER_BODY,
+    script=VIEWER_SCRIPT,
+    stats_client=_STATS_CLIENT_JS,
+)
+
 # ==========================================
 # BROADCASTER DASHBOARD (Global Monitor Focus)
 # ==========================================
-BROADCASTER_HTML = """
-<!DOCTYPE html>
-<html>
-<head>
-    <title>Global Network Monitor (Broadcaster)</title>
-    <style>
+BROADCASTER_STYLE = """
         body { background-color: #000; color: #00ff00; font-family: monospace; padding: 20px; }
         .card { border: 1px solid #444; padding: 15px; margin-bottom: 20px; border-radius: 5px; background: #111; }
         h1 { color: #fff; border-bottom: 1px solid #333; padding-bottom: 10px; }
@@ -151,11 +253,9 @@ BROADCASTER_HTML = """
         th { background-color: #222; }
         .metric-big { font-size: 2em; font-weight: bold; color: #fff; }
         .grid-container { display: flex; flex-wrap: wrap; gap: 20px; }
-        .peer-card { flex: 0 0 300px; border: 1px solid #333; background: #1a1a1a; padding: 10px; border-radius: 4px; }
-    </style>
-    <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
-</head>
-<body>
+        .peer-card { flex: 0 0 300px; border: 1px solid #333; background: #1a1a1a; padding: 10px; border-radius: 4px; }"""
+
+BROADCASTER_BODY = """
     <h1>GLOBAL NETWORK MONITOR</h1>
     
     <div class="card">
@@ -206,8 +306,9 @@ BROADCASTER_HTML = """
     <div id="peer_cards_container" class="grid-container">
         <!-- Dynamic Cards -->
     </div>
+"""
 
-    <script>
+BROADCASTER_SCRIPT = """
         // --- CHARTS SETUP ---
         const globalSourceChart = new Chart(document.getElementById('globalSourceChart').getContext('2d'), {
             type: 'bar',
@@ -221,187 +322,375 @@ BROADCASTER_HTML = """
         });
 
         const colorPalette = ['#36a2eb', '#ff6384', '#cc65fe', '#ffce56', '#4bc0c0', '#9966ff', '#ff9f40', '#e7e9ed', '#71B37C'];
+        const colorCache = new Map(); // source -> palette color, the palette never changes
         function getColor(str) {
+            let color = colorCache.get(str);
+            if (color) return color;
             let hash = 0;
             for (let i = 0; i < str.length; i++) { hash = str.charCodeAt(i) + ((hash << 5) - hash); }
-            return colorPalette[Math.abs(hash) % colorPalette.length];
+            color = colorPalette[Math.abs(hash) % colorPalette.length];
+            colorCache.set(str, color);
+            return color;
         }
 
-        const peerChartInstances = {};
+        // Peer cards draw their pies directly on a canvas; one Chart.js instance per peer was too heavy.
+        const peerCards = {}; // addr -> card element
+        function drawPie(canvas, values, colors) {
+            const ctx = canvas.getContext('2d');
+            const w = canvas.width, h = canvas.height;
+            ctx.clearRect(0, 0, w, h);
+            const total = values.reduce((a, b) => a + b, 0);
+            if (total <= 0) return;
+            const cx = w / 2, cy = h / 2, r = Math.min(w, h) / 2 - 2;
+            let a0 = -Math.PI / 2;
+            values.forEach((v, i) => {
+                const a1 = a0 + v / total * 2 * Math.PI;
+                ctx.beginPath();
+                ctx.moveTo(cx, cy);
+                ctx.arc(cx, cy, r, a0, a1);
+                ctx.closePath();
+                ctx.fillStyle = colors[i];
+                ctx.fill();
+                a0 = a1;
+            });
+        }
+        const tableRows = new Map(); // addr -> <tr>, reused across updates
         // Keep track of all unique sources we have ever seen to prevent color shifting
         const knownSources = new Set(); 
+        // Stacked chart datasets by source label, kept in sync with globalSourceChart.data.datasets
+        const datasetByLabel = new Map();
+        const EMPTY_SOURCES = {};
 
-        function updateStats() {
-            fetch('/api/stats')
-                .then(response => response.json())
-                .then(data => {
-                    // 1. Summary
-                    document.getElementById('uptime').textContent = data.uptime + 's';
-                    document.getElementById('broadcast_rate').textContent = (data.upload_rate / 1024).toFixed(1);
-
-                    // Global Stats Processing
-                    const gStats = data.global_stats || {};
-                    const peers = Object.keys(gStats).sort();
-                    document.getElementById('total_nodes').textContent = peers.length + 1; // +1 for self
-
-                    // 2. Table Update
-                    const tableBody = document.getElementById('global_table_body');
-                    // ... (keep table logic same, just focusing on chart logic for this replacement block)
-                    // Wait, I need to include the table logic if I replace the whole block.
-                    // To keep it simple, let's just replace the Chart Update logic part specifically if possible, 
-                    // or rewrite the whole function carefully.
-                    
-                    tableBody.innerHTML = '';
-                    peers.forEach(addr => {
-                        const s = gStats[addr];
-                        const age = (new Date().getTime()/1000 - s.last_seen).toFixed(1);
-                        let status = "OK";
-                        let color = "#0f0";
-                        if(age > 5) { status="LAG"; color="#fa0"; }
-                        if(age > 10) { status="LOST"; color="#f00"; }
-                        
-                        let sourceText = "";
-                        if(s.sources) {
-                           let total = Object.values(s.sources).reduce((a,b)=>a+b, 0);
-                           if(total > 0) {
-                               let parts = [];
-                               Object.keys(s.sources).forEach(k => {
-                                   let pct = Math.round(s.sources[k]/total * 100);
-                                   if(pct>1) parts.push(`${k}: ${pct}%`);
-                               });
-                               sourceText = parts.join(', ');
-                           }
-                        }
-
-                        const row = `<tr>
-                           <td>${addr}</td>
-                           <td>${s.role}</td>
-                           <td>${(s.dl_rate/1024).toFixed(1)}</td>
-                           <td>${(s.ul_rate/1024).toFixed(1)}</td>
-                           <td>${s.buffer}</td>
-                           <td>${s.rtt.toFixed(0)}</td>
-                           <td style="font-size:0.8em; color:#ccc;">${sourceText}</td>
-                           <td style="color:${color}">${status} (${age}s ago)</td>
-                        </tr>`;
-                        tableBody.innerHTML += row;
-                    });
+        // Peer addresses in sorted order; only re-sorted when the set of peers changes
+        let sortedPeers = [];
+        let sortedPeerSet = new Set();
+        function sortedPeerKeys(gStats) {
+            const keys = Object.keys(gStats);
+            if (keys.length !== sortedPeers.length || keys.some(k => !sortedPeerSet.has(k))) {
+                sortedPeers = keys.sort();
+                sortedPeerSet = new Set(sortedPeers);
+            }
+            return sortedPeers;
+        }
 
-                    // 3. Stacked Chart STABILIZED (Object Reuse Mode)
-                    // Update known sources
-                    peers.forEach(p => {
-                        if(gStats[p].sources) Object.keys(gStats[p].sources).forEach(k => knownSources.add(k));
-                    });
-                    const sourceList = Array.from(knownSources).sort(); 
-                    
-                    // Update Labels (X-Axis)
-                    globalSourceChart.data.labels = peers;
-                    
-                    // Update Datasets: Sync with sourceList order
-                    // We rebuild the datasets array, BUT we try to preserve existing objects if possible?
-                    // actually, for stacked charts, order matters.
-                    // Let's map sourceList to datasets.
-                    
-                    const nextDatasets = sourceList.map(src => {
-                        // Find existing dataset for this source to reuse color/meta
-                        let existing = globalSourceChart.data.datasets.find(d => d.label === src);
-                        
-                        const newData = peers.map(p => {
-                             let val = 0;
-                             if(gStats[p].sources && gStats[p].sources[src]) val = gStats[p].sources[src];
-                             return val / 1024; // KB
-                        });
-
-                        if (existing) {
-                            existing.data = newData;
-                            return existing;
-                        } else {
-                            return {
-                                label: src,
-                                data: newData,
-                                backgroundColor: getColor(src)
-                            };
-                        }
-                    });
-                    
-                    globalSourceChart.data.datasets = nextDatasets;
-                    globalSourceChart.update('none'); // ZERO animation update
-
-                    // 4. Peer Cards (Pie Charts)
-                    const container = document.getElementById('peer_cards_container');
-                    
-                    // Cleanup old
-                    Object.keys(peerChartInstances).forEach(p => {
-                        if(!gStats[p]) {
-                            peerChartInstances[p].destroy();
-                            delete peerChartInstances[p];
-                            const el = document.getElementById('card_' + p.replace(/[^a-zA-Z0-9]/g, '_'));
-                            if(el) el.remove();
-                        }
-                    });
+        // Element handles, resolved once
+        const el = {};
+        ['uptime', 'broadcast_rate', 'total_nodes', 'global_table_body', 'peer_cards_container']
+            .forEach(id => { el[id] = document.getElementById(id); });
 
-                    peers.forEach(p => {
-                        const safeId = 'card_' + p.replace(/[^a-zA-Z0-9]/g, '_');
-                        let card = document.getElementById(safeId);
-                        if(!card) {
-                            card = document.createElement('div');
-                            card.className = "peer-card";
-                            card.id = safeId;
-                            card.innerHTML = `
-                                <div style="font-weight:bold; margin-bottom:5px;">${p}</div>
-                                <div style="height:200px;"><canvas id="canvas_${safeId}"></canvas></div>
-                                <div style="text-align:center; font-size:0.8em; margin-top:5px;">Buf: <span id="buf_${safeId}"></span></div>
-                            `;
-                            container.appendChild(card);
-                            peerChartInstances[p] = new Chart(document.getElementById(`canvas_${safeId}`).getContext('2d'), {
-                                type: 'pie',
-                                data: { labels: [], datasets: [{ data: [], backgroundColor: [] }] },
-                                options: { maintainAspectRatio: false, plugins: { legend: { display: false } } }
-                            });
-                        }
-                        
-                        // Update Card Data
-                        document.getElementById(`buf_${safeId}`).textContent = gStats[p].buffer;
-                        
-                        const srcObj = gStats[p].sources || {};
-                        const labels = Object.keys(srcObj);
-                        const dataVals = Object.values(srcObj).map(v=>(v/1024).toFixed(2));
-                        const colors = labels.map(l => getColor(l));
-                        
-                        const chart = peerChartInstances[p];
-                        chart.data.labels = labels;
-                        chart.data.datasets[0].data = dataVals;
-                        chart.data.datasets[0].backgroundColor = colors;
-                        chart.update();
-                    });
+        function updateStats(data) {
+            // 1. Summary
+            el.uptime.textContent = data.uptime + 's';
+            el.broadcast_rate.textContent = (data.upload_rate / 1024).toFixed(1);
+
+            // Global Stats Processing
+            const gStats = data.global_stats || {};
+            const peers = sortedPeerKeys(gStats);
+            el.total_nodes.textContent = peers.length + 1; // +1 for self
+
+            // 2. Table Update (Row Reuse Mode): rows are kept per address and only
+            // their cell text is rewritten, instead of re-parsing the whole table.
+            const tableBody = el.global_table_body;
+            tableRows.forEach((tr, addr) => {
+                if(!gStats[addr]) { tr.remove(); tableRows.delete(addr); }
+            });
+
+            const nowSec = Date.now() / 1000;
+            peers.forEach((addr, i) => {
+                const s = gStats[addr];
+                const age = (nowSec - s.last_seen).toFixed(1);
+                let status = "OK";
+                let color = "#0f0";
+                if(age > 5) { status="LAG"; color="#fa0"; }
+                if(age > 10) { status="LOST"; color="#f00"; }
+                
+                let sourceText = "";
+                if(s.sources) {
+                   let total = Object.values(s.sources).reduce((a,b)=>a+b, 0);
+                   if(total > 0) {
+                       let parts = [];
+                       Object.keys(s.sources).forEach(k => {
+                           let pct = Math.round(s.sources[k]/total * 100);
+                           if(pct>1) parts.push(`${k}: ${pct}%`);
+                       });
+                       sourceText = parts.join(', ');
+                   }
+                }
+
+                let tr = tableRows.get(addr);
+                if(!tr) {
+                    tr = document.createElement('tr');
+                    for(let c = 0; c < 8; c++) tr.appendChild(document.createElement('td'));
+                    tr.cells[6].style.fontSize = '0.8em';
+                    tr.cells[6].style.color = '#ccc';
+                    tableRows.set(addr, tr);
+                }
+                // Keep rows in sorted peer order; only moves rows that are out of place
+                if(tableBody.children[i] !== tr) tableBody.insertBefore(tr, tableBody.children[i] || null);
+
+                const cells = tr.cells;
+                cells[0].textContent = addr;
+                cells[1].textContent = s.role;
+                cells[2].textContent = (s.dl_rate/1024).toFixed(1);
+                cells[3].textContent = (s.ul_rate/1024).toFixed(1);
+                cells[4].textContent = s.buffer;
+                cells[5].textContent = s.rtt.toFixed(0);
+                cells[6].textContent = sourceText;
+                cells[7].textContent = `${status} (${age}s ago)`;
+                cells[7].style.color = color;
+            });
+
+            // 3. Stacked Chart STABILIZED (Object Reuse Mode)
+            // Resolve each peer's sources dict once for the whole chart rebuild
+            const peerSources = peers.map(p => gStats[p].sources || EMPTY_SOURCES);
+            // Update known sources
+            peerSources.forEach(ps => Object.keys(ps).forEach(k => knownSources.add(k)));
+            const sourceList = Array.from(knownSources).sort(); 
+            
+            // Update Labels (X-Axis)
+            globalSourceChart.data.labels = peers;
+            
+            // Update Datasets: Sync with sourceList order
+            // We rebuild the datasets array, BUT we try to preserve existing objects if possible?
+            // actually, for stacked charts, order matters.
+            // Let's map sourceList to datasets.
+            
+            const nextDatasets = sourceList.map(src => {
+                // Find existing dataset for this source to reuse color/meta
+                let existing = datasetByLabel.get(src);
+                
+                const newData = peerSources.map(ps => (ps[src] || 0) / 1024); // KB
+
+                if (existing) {
+                    existing.data = newData;
+                    return existing;
+                } else {
+                    return {
+                        label: src,
+                        data: newData,
+                        backgroundColor: getColor(src)
+                    };
+                }
+            });
+            
+            globalSourceChart.data.datasets = nextDatasets;
+            datasetByLabel.clear();
+            nextDatasets.forEach(d => datasetByLabel.set(d.label, d));
+            globalSourceChart.update('none'); // ZERO animation update
+
+            // 4. Peer Cards (Pie Charts)
+            const container = el.peer_cards_container;
+            
+            // Cleanup old
+            Object.keys(peerCards).forEach(p => {
+                if(!gStats[p]) {
+                    peerCards[p].remove();
+                    delete peerCards[p];
+                }
+            });
+
+            peers.forEach(p => {
+                const safeId = 'card_' + p.replace(/[^a-zA-Z0-9]/g, '_');
+                let card = peerCards[p];
+                if(!card) {
+                    card = document.createElement('div');
+                    card.className = "peer-card";
+                    card.id = safeId;
+
+                    const title = document.createElement('div');
+                    title.style.fontWeight = 'bold';
+                    title.style.marginBottom = '5px';
+                    title.textContent = p;
+
+                    const canvasWrap = document.createElement('div');
+                    canvasWrap.style.height = '200px';
+                    const canvas = document.createElement('canvas');
+                    canvas.width = 280;
+                    canvas.height = 200;
+                    canvasWrap.appendChild(canvas);
+
+                    const bufRow = document.createElement('div');
+                    bufRow.style.textAlign = 'center';
+                    bufRow.style.fontSize = '0.8em';
+                    bufRow.style.marginTop = '5px';
+                    const bufSpan = document.createElement('span');
+                    bufRow.append('Buf: ', bufSpan);
+
+                    card.append(title, canvasWrap, bufRow);
+                    container.appendChild(card);
+                    card._bufEl = bufSpan;
+                    card._canvas = canvas;
+                    peerCards[p] = card;
+                }
+                
+                // Update Card Data
+                card._bufEl.textContent = gStats[p].buffer;
+                
+                const srcObj = gStats[p].sources || {};
+                const labels = Object.keys(srcObj);
+                const dataVals = Object.values(srcObj).map(v => v / 1024);
+                
+                const key = JSON.stringify([labels, dataVals]);
+                if (key !== card._key) {
+                    card._key = key;
+                    const canvas = card._canvas;
+                    drawPie(canvas, dataVals, labels.map(l => getColor(l)));
+                    canvas.title = labels.map((l, i) => `${l}: ${dataVals[i].toFixed(2)} KB`).join('\\n');
+                }
+            });
 
-                });
         }
-        setInterval(updateStats, 1000);
-    </script>
-</body>
-</html>
 """
 
+BROADCASTER_HTML = _BASE_HTML.format(
+    title="Global Network Monitor (Broadcaster)",
+    style=BROADCASTER_STYLE,
+    body=BROADCASTER_BODY,
+    script=BROADCASTER_SCRIPT,
+    stats_client=_STATS_CLIENT_JS,
+)
+
+def _precompress(html: str) -> tuple:
+    """
+    Encodes a page once at import time: (raw bytes, gzip bytes).
+    """
+    body = html.encode('utf-8')
+    return body, gzip.compress(body, 9)
+
+VIEWER_PAGE = _precompress(VIEWER_HTML)
+BROADCASTER_PAGE = _precompress(BROADCASTER_HTML)
+
+def _write_index(page: tuple) -> str:
+    """
+    Writes the page and its .gz sibling to a temp dir so that FileResponse can
+    sendfile() them from the page cache. Returns the path of index.html.
+    """
+    body, body_gz = page
+    tmpdir = tempfile.mkdtemp(prefix="p2p_dashboard_")
+    atexit.register(shutil.rmtree, tmpdir, True)
+    path = os.path.join(tmpdir, "index.html")
+    with open(path, "wb") as f:
+        f.write(body)
+    with open(path + ".gz", "wb") as f:
+        f.write(body_gz)
+    return path
+
+# index.html for this node's role, written once in start_dashboard
+_index_path: Optional[str] = None
+
 async def handle_index(request):
-    # Determine which template to serve based on Role
-    role = StatsManager().role
-    if role == "broadcaster":
-        return web.Response(text=BROADCASTER_HTML, content_type='text/html')
-    else:
-        return web.Response(text=VIEWER_HTML, content_type='text/html')
+    # FileResponse picks index.html.gz when the client accepts gzip and
+    # answers If-None-Match / If-Modified-Since with 304 on its own.
+    return web.FileResponse(_index_path, headers={'Cache-Control': 'public, max-age=60'})
+
+# Serialized stats are shared by all clients for this many seconds
+STATS_CACHE_TTL = 0.5
+_cached_body: Optional[bytes] = None
+_cached_at = 0.0
+
+def _dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode('utf-8')
+
+def _stats_body() -> bytes:
+    """
+    Returns the JSON-encoded stats, recomputing at most once per STATS_CACHE_TTL.
+    """
+    global _cached_body, _cached_at
+    now = time.monotonic()
+    if _cached_body is None or now - _cached_at >= STATS_CACHE_TTL:
+        _cached_body = _dumps(_stats.get_stats())
+        _cached_at = now
+    return _cached_body
 
 async def handle_stats(request):
-    stats = StatsManager().get_stats()
-    return web.json_response(stats)
+    return web.Response(body=_stats_body(), content_type='application/json')
+
+# WebSocket clients subscribed to the pushed stats feed
+_subscribers = set()
+# Subscribers that still need a full snapshot before they can apply deltas
+_needs_full = set()
+
+async def handle_ws(request):
+    ws = web.WebSocketResponse()
+    await ws.prepare(request)
+    _subscribers.add(ws)
+    _needs_full.add(ws)
+    try:
+        # Clients never send anything; just wait for the socket to close.
+        async for _ in ws:
+            pass
+    finally:
+        _subscribers.discard(ws)
+        _needs_full.discard(ws)
+    return ws
+
+def _stats_delta(prev: dict, cur: dict) -> dict:
+    """
+    Returns the top-level keys of cur whose value differs from prev.
+    global_stats is diffed one level deeper; None marks a peer that is gone.
+    """
+    delta = {}
+    for key, value in cur.items():
+        old = prev.get(key)
+        if key == "global_stats" and isinstance(old, dict):
+            peers = {addr: s for addr, s in value.items() if old.get(addr) != s}
+            peers.update({addr: None for addr in old if addr not in value})
+            if peers:
+                delta[key] = peers
+        elif old != value:
+            delta[key] = value
+    return delta
+
+async def broadcast_loop():
+    """
+    Computes the stats once per second and pushes them to every subscriber,
+    so the cost no longer scales with clients. New subscribers get a full
+    snapshot; everyone else only gets the keys that changed since last tick.
+    """
+    last = None # snapshot that synced subscribers currently hold
+    while True:
+        await asyncio.sleep(1.0)
+        if not _subscribers:
+            # Nobody is watching: skip get_stats() and the copy entirely
+            last = None
+            continue
+        # get_stats() hands out live dicts; copy so the next diff sees the change
+        stats = copy.deepcopy(_stats.get_stats())
+        full_payload = delta_payload = None
+        for ws in list(_subscribers):
+            if last is None or ws in _needs_full:
+                if full_payload is None:
+                    full_payload = _dumps({"type": "full", "data": stats})
+                payload = full_payload
+            else:
+                if delta_payload is None:
+                    delta_payload = _dumps({"type": "delta", "data": _stats_delta(last, stats)})
+                payload = delta_payload
+            try:
+                # Binary frames carry the encoder's bytes as-is (no str round trip)
+                await ws.send_bytes(payload)
+                _needs_full.discard(ws)
+            except ConnectionResetError:
+                _subscribers.discard(ws)
+                _needs_full.discard(ws)
+        last = stats
 
 async def start_dashboard(port=8888):
+    global _index_path
+    # Role is fixed before the dashboard starts; choose the template once.
+    _index_path = _write_index(BROADCASTER_PAGE if _stats.role == "broadcaster" else VIEWER_PAGE)
+
     app = web.Application()
     app.router.add_get('/', handle_index)
-    app.router.add_get('/api/stats', handle_stats)
+    app.router.add_get('/api/stats', handle_stats) # REST fallback
+    app.router.add_get('/ws/stats', handle_ws)
     
     runner = web.AppRunner(app)
     await runner.setup()
     site = web.TCPSite(runner, '0.0.0.0', port)
     await site.start()
+    asyncio.create_task(broadcast_loop())
     logger.info(f"Dashboard started at http://localhost:{port}")
     return site
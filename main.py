@@ -4,6 +4,7 @@ import argparse
 import logging
 import cv2
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 
 from p2p_node import P2PNode
@@ -13,6 +14,11 @@ from video_player import FrameReassembler, VideoRenderer
 import p2p_protocol as P2P
 from protocol import Packet
 
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
 # Configure Logging
 logging.basicConfig(
     level=logging.INFO,
@@ -24,113 +30,137 @@ logging.basicConfig(
 )
 logger = logging.getLogger("Main")
 
+# Broadcaster capture cadence (20 fps)
+FRAME_INTERVAL = 0.05
+
+# Max chunk ids waiting for the viewer (a few seconds of video at ~1000 B/chunk)
+VIEWER_QUEUE_SIZE = 4096
+
+def _capture_and_fragment(capturer: ScreenCapturer, frame_id: int):
+    """
+    Encode pipeline stage, runs on the encode thread: Capture -> Fragment.
+    Returns (frame_bytes, chunks), or (None, None) if the capture failed.
+    """
+    frame_bytes = capturer.capture_frame()
+    if not frame_bytes:
+        return None, None
+    return frame_bytes, FrameFragmenter.fragment(frame_id, frame_bytes)
+
 async def broadcaster_loop(node: P2PNode):
     """
     Broadcaster Logic: Capture -> Fragment -> Store/Broadcast
     """
-    capturer = ScreenCapturer(width=640, height=480)
+    # Capture + JPEG encode + fragmenting run on a dedicated thread so they don't
+    # block packet handling on the event loop. The capturer is created on that same
+    # thread because mss handles are thread-bound on some platforms.
+    loop = asyncio.get_running_loop()
+    encode_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="encode")
+    capturer = await loop.run_in_executor(encode_pool, lambda: ScreenCapturer(width=640, height=480))
     current_frame_id = 0
     
     logger.info("Starting Broadcaster Loop...")
     
-    while True:
-        # 1. Capture
-        frame_bytes = capturer.capture_frame()
-        if not frame_bytes:
-            await asyncio.sleep(0.1)
-            continue
-            
-        current_frame_id += 1
-        
-        # 2. Fragment
-        chunks = FrameFragmenter.fragment(current_frame_id, frame_bytes)
-        
-        # 3. Store in P2P Node
-        new_chunk_ids = set()
-        for chunk_id, payload in chunks:
-            # We bypass the network for ourselves and inject directly into data_store
-            # Note: We need to strip the L1 Header part if we were using send_packet,
-            # but P2PNode expects raw payload in data_store if we are the source.
-            # Wait, P2PNode.data_store stores the P2P PAYLOAD (Layer 2 payload).
-            # Layer 2 payload for TYPE_DATA is just the raw bytes?
-            # Let's check p2p_node.py:
-            #   self.data_store[seq] = packet.payload
-            #   And send_data uses: packet.payload = data
-            # So yes, we store the packed Layer 3 payload (ChunkPayload) directly into data_store.
-            node.data_store[chunk_id] = payload
-            new_chunk_ids.add(chunk_id)
+    # Fixed-rate schedule on the loop's monotonic clock: encode time doesn't add to the period
+    next_t = loop.time()
+    
+    try:
+        while True:
+            # 1. Capture + 2. Fragment
+            frame_bytes, chunks = await loop.run_in_executor(
+                encode_pool, _capture_and_fragment, capturer, current_frame_id + 1
+            )
+            if not frame_bytes:
+                await asyncio.sleep(0.1)
+                next_t = loop.time()
+                continue
+                
+            current_frame_id += 1
             
-            # TRIGGER ALGORITHM HOOK (For Splitter Push)
-            # This makes the broadcaster actively configure the distribution
-            node.algorithm.on_chunk_generated(chunk_id, payload)
+            # 3. Store in P2P Node
+            for chunk_id, payload in chunks:
+                # We bypass the network for ourselves and store the packed Layer 3
+                # payload (ChunkPayload) directly, exactly as a received DATA packet would be.
+                node.store_chunk(chunk_id, payload)
             
-        # 4. Update my_bitmap
-        node.my_bitmap.update(new_chunk_ids)
-        
-        # 5. Clean up old frames
-        # Remove frames older than 1000 frames (approx 50 seconds at 20fps)
-        # This gives plenty of time for new peers to catch up or for retransmissions.
-        if current_frame_id > 1000:
-            old_frame_id = current_frame_id - 1000
-            # Rough cleanup: chunks are frame_id * 1000 + frag_index
-            # Calculate range of chunk IDs to remove
-            start_chunk = old_frame_id * 1000
-            end_chunk = (old_frame_id + 1) * 1000
+                # TRIGGER ALGORITHM HOOK (For Splitter Push)
+                # This makes the broadcaster actively configure the distribution
+                node.algorithm.on_chunk_generated(chunk_id, payload)
+            node.frame_chunks[current_frame_id] = [chunk_id for chunk_id, _ in chunks]
             
-            # Identify chunks to remove
-            to_remove = [c for c in node.data_store.keys() if start_chunk <= c < end_chunk]
-            for c in to_remove:
-                del node.data_store[c]
-                if c in node.my_bitmap:
-                    node.my_bitmap.remove(c)
-        await asyncio.sleep(0.05)
+            # 4. Clean up old frames
+            # Remove frames older than 1000 frames (approx 50 seconds at 20fps)
+            # This gives plenty of time for new peers to catch up or for retransmissions.
+            if current_frame_id > 1000:
+                for c in node.frame_chunks.pop(current_frame_id - 1000, ()):
+                    node.data_store.pop(c, None)
+                    node.my_bitmap.discard(c)
+
+            next_t += FRAME_INTERVAL
+            delay = next_t - loop.time()
+            if delay < -5 * FRAME_INTERVAL:
+                # More than 5 frames behind: skip the missed slots instead of bursting to catch up
+                next_t = loop.time()
+                delay = 0
+            await asyncio.sleep(max(0, delay))
+    finally:
+        encode_pool.shutdown(wait=False)
 
 async def viewer_loop(node: P2PNode):
     """
-    Viewer Logic: Poll P2PNode data_store -> Reassemble -> Render
+    Viewer Logic: Wait for new chunks from P2PNode -> Reassemble -> Render
     """
     reassembler = FrameReassembler()
     renderer = VideoRenderer("P2P Stream Viewer")
     
     logger.info("Starting Viewer Loop...")
     
-    # We maintain a set of 'processed' chunk IDs to avoid re-processing
-    processed_chunks = set()
+    # P2PNode pushes every newly stored chunk id here (each id exactly once), so we only
+    # wake up when there is work and need no 'processed' bookkeeping. The queue is bounded;
+    # if rendering falls behind, the oldest chunks are dropped.
+    queue = asyncio.Queue(maxsize=VIEWER_QUEUE_SIZE)
+    for chunk_id in sorted(node.data_store)[-VIEWER_QUEUE_SIZE:]:
+        queue.put_nowait(chunk_id)
+    node.new_chunk_queue = queue
+
+    # CV2 UI update: the renderer's GUI thread keeps the window responsive. Where the GUI
+    # has to stay on the main thread (Mac), pump it from a timer instead, so it doesn't
+    # go 'Not Responding' when no frames arrive.
+    loop = asyncio.get_running_loop()
+    pump = None
+    def pump_ui():
+        nonlocal pump
+        cv2.waitKey(1)
+        pump = loop.call_later(0.016, pump_ui)
+    if renderer.gui is None:
+        pump = loop.call_later(0.016, pump_ui)
     
-    while True:
-        # Check P2PNode for new chunks
-        # Because P2PNode runs in background, it populates node.data_store
-        
-        # Find chunks we have in data store but haven't fed to reassembler
-        # Optimziation: In a high perfrormance system, P2PNode would push to a Queue.
-        # Here we poll for simplicity.
-        
-        available_ids = set(node.data_store.keys())
-        new_ids = available_ids - processed_chunks
-        
-        if new_ids:
-            for chunk_id in new_ids:
-                payload = node.data_store[chunk_id]
-                processed_chunks.add(chunk_id)
+    try:
+        while True:
+            chunk_ids = [await queue.get()]
+            # Drain whatever else arrived in the same batch
+            while not queue.empty():
+                chunk_ids.append(queue.get_nowait())
+
+            for chunk_id in chunk_ids:
+                payload = node.data_store.get(chunk_id)
+                if payload is None:
+                    continue
                 
                 # Feed to reassembler
                 jpeg_frame = reassembler.add_fragment(payload)
                 if jpeg_frame:
                     # We got a full frame! Render it!
-                    renderer.render(jpeg_frame)
-
-        # Important: CV2 UI update
-        # cv2.waitKey(1) is called inside renderer.render, 
-        # but if no frames arrive, we still need to pump the UI loop occasionally?
-        # Not strictly necessary if we rely on render calls, but good for responsiveness.
-        # However, to avoid 'Not Responding' on Mac, we explicitly waitKey here if idle.
-        if not new_ids:
-            cv2.waitKey(1) 
-
-        await asyncio.sleep(0.01)
+                    await renderer.render_async(jpeg_frame)
+    finally:
+        if pump:
+            pump.cancel()
+        renderer.close()
+        node.new_chunk_queue = None
 
 def get_lan_ips():
     ips = []
+    # Note: this scratch socket is only used for interface discovery. The buffer tuning
+    # (SO_RCVBUF/SO_SNDBUF) for the real P2P socket lives in UDPTransport.start_server.
     # Method 1: Connect generic (gives default route interface)
     s = None
     try:
@@ -163,6 +193,7 @@ async def main():
     parser.add_argument('--port', type=int, required=True, help="UDP Port to bind")
     parser.add_argument('--connect', type=str, help="Initial peer to connect to (host:port)")
     parser.add_argument('--algo', choices=['default', 'rarest', 'edf'], default='default', help="P2P Algorithm strategy")
+    parser.add_argument('--multicast', type=str, help="LAN multicast group for bitmap/heartbeat fan-out (group:port, e.g. 239.255.42.1:9999); every node must use it")
     
     args = parser.parse_args()
     
@@ -180,7 +211,11 @@ async def main():
 
     # 1. Start P2P Node
     host = "0.0.0.0" # Bind all interfaces
-    node = P2PNode(host, args.port, role=args.role, algo_name=args.algo)
+    multicast = None
+    if args.multicast:
+        group, group_port = args.multicast.split(":")
+        multicast = (group, int(group_port))
+    node = P2PNode(host, args.port, role=args.role, algo_name=args.algo, multicast=multicast)
     await node.start()
     
     # 2. Connect to peer if specified
@@ -214,6 +249,9 @@ async def main():
         cv2.destroyAllWindows()
 
 if __name__ == "__main__":
+    if uvloop is not None:
+        # libuv event loop: cheaper per-datagram I/O for the UDP-heavy P2P loops
+        uvloop.install()
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
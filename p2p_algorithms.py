@@ -2,14 +2,84 @@ import logging
 import time
 import random
 import json
+import struct
 from enum import Enum
 from typing import Set, Dict, List, Optional, Tuple, Any
 
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
 import p2p_protocol as P2P
-from protocol import Packet
+from protocol import Packet, HEADER_SIZE, TIMESTAMP_OFFSET
 
 logger = logging.getLogger(__name__)
 
+# Fields patched into EDF's prebuilt REQUEST (see _send_request)
+_TIMESTAMP = struct.Struct("!d")
+_SEQ = struct.Struct("!I")
+
+def _rarest_kernel_numpy(peer_matrix: np.ndarray, need: np.ndarray, k: int) -> np.ndarray:
+    counts = np.unpackbits(peer_matrix.view(np.uint8), axis=1, bitorder='little').sum(axis=0)
+    need_bits = np.unpackbits(need.view(np.uint8), bitorder='little')
+    candidates = np.flatnonzero(need_bits & (counts > 0))
+    return candidates[np.argsort(counts[candidates], kind='stable')[:k]]
+
+if numba is not None:
+    @numba.njit(cache=True)
+    def _rarest_kernel(peer_matrix, need, k):
+        n_peers, n_words = peer_matrix.shape
+        top_off = np.full(k, -1, np.int64)
+        top_cnt = np.full(k, np.iinfo(np.int64).max, np.int64)
+        one = np.uint64(1)
+        for w in range(n_words):
+            mask = need[w]
+            if mask == 0:
+                continue
+            for b in range(64):
+                if not (mask >> np.uint64(b)) & one:
+                    continue
+                cnt = 0
+                for p in range(n_peers):
+                    cnt += (peer_matrix[p, w] >> np.uint64(b)) & one
+                if cnt == 0 or cnt >= top_cnt[k - 1]:
+                    continue
+                # Insertion into the sorted top-k (ties keep the lower id first)
+                j = k - 1
+                while j > 0 and top_cnt[j - 1] > cnt:
+                    top_cnt[j] = top_cnt[j - 1]
+                    top_off[j] = top_off[j - 1]
+                    j -= 1
+                top_cnt[j] = cnt
+                top_off[j] = w * 64 + b
+        return top_off[top_off >= 0]
+else:
+    _rarest_kernel = _rarest_kernel_numpy
+
+def rarest_chunks(peer_matrix: np.ndarray, need: np.ndarray, k: int) -> np.ndarray:
+    """
+    peer_matrix: [n_peers, n_words] packed peer bitmaps, need: [n_words] packed missing-chunk mask.
+    Returns up to k bit offsets of needed chunks that some peer has, fewest owners first.
+    Compiled with numba when available, numpy otherwise.
+    """
+    return _rarest_kernel(peer_matrix, need, k)
+
+def pick_random_owner(chunk_id: int, peers: Dict[tuple, Any]) -> Optional[tuple]:
+    """
+    Uniformly picks one peer advertising chunk_id in a single pass (reservoir sampling), or None.
+    """
+    chosen = None
+    n = 0
+    for addr, peer in peers.items():
+        if chunk_id in peer.remote_bitmap:
+            n += 1
+            if random.random() * n < 1:
+                chosen = addr
+    return chosen
+
 class P2PAlgorithm:
     """
     Abstract Base Class for P2P Strategies.
@@ -53,7 +123,7 @@ class SplitterAlgorithm(P2PAlgorithm):
         """
         Special hook for Broadcaster: Active Push (Round-Robin).
         """
-        peers = list(self.node.peer_manager.get_active_peers().keys())
+        peers = self.node.peer_manager.get_peer_addrs()
         if not peers:
             return
 
@@ -75,7 +145,45 @@ class DefaultPushAlgorithm(P2PAlgorithm):
     def __init__(self, node):
         super().__init__(node)
         self.pending_push = {} # chunk_id -> set(target_addrs)
+        self.push_budget = 150_000 # bytes per tick (~1.5 MB/s at 10Hz)
+        # Prebuilt REQUEST packet; only the timestamp and chunk id are patched per send
+        self._request_buf = bytearray(Packet(
+            ver=P2P.PROTOCOL_VERSION, msg_type=P2P.TYPE_REQUEST, seq=0,
+            timestamp=0.0, payload=bytes(4)
+        ).pack())
+
+    def handle_packet(self, packet: Packet, addr: tuple) -> bool:
+        """
+        Intercept REQUEST to perform Deduplication (ALGO.md 3.2.3)
+        """
+        if packet.msg_type == P2P.TYPE_REQUEST and self.pending_push:
+            try:
+                seqs = P2P.parse_request(packet)
+            except (ValueError, struct.error):
+                # Malformed REQUEST: nothing to dedup, P2PNode's handler reports it
+                return False
+            for seq in seqs:
+                self._dedup_request(seq, addr)
+        # Let P2PNode send the DATA reply
+        return False
+
+    def _dedup_request(self, seq: int, addr: tuple):
+        """
+        If this chunk was already queued to be PUSHED to addr, drop it from the Push queue
+        (we are about to send it as the REQUEST response).
+        """
+        targets = self.pending_push.get(seq)
+        if targets and addr in targets:
+            targets.remove(addr)
+            if not targets:
+                del self.pending_push[seq]
     
+    def _send_request(self, chunk_id: int, target: tuple):
+        buf = self._request_buf
+        _TIMESTAMP.pack_into(buf, TIMESTAMP_OFFSET, time.time())
+        _SEQ.pack_into(buf, HEADER_SIZE, chunk_id)
+        self.node.transport.send_raw(bytes(buf), target)
+
     def on_chunk_received(self, chunk_id: int, payload: bytes, source_addr: tuple):
         # FLOOD: Schedule this chunk to be sent to ALL neighbors (except source)
         peers = self.node.peer_manager.get_active_peers()
@@ -87,33 +195,31 @@ class DefaultPushAlgorithm(P2PAlgorithm):
 
     def on_tick(self):
         # Process Pending Push Queue
-        # Simple FIFO or random selection to drain queue
+        # FIFO drain of the whole queue, bounded by a per-tick byte budget
         if not self.pending_push:
             return
             
-        # Process a few pushes per tick
-        processed = 0
-        limit = 5 
+        budget = self.push_budget
+        batches = {} # target -> [chunk_id, ...], sent in one go
         
         # Snapshot to iterate
         keys = list(self.pending_push.keys())
         for chunk_id in keys:
             targets = self.pending_push[chunk_id]
-            if not targets:
-                del self.pending_push[chunk_id]
-                continue
-                
-            # Pop one target
-            target = targets.pop(0)
-            
-            # Send
             # We assume node has the data since we just received it
-            # But we should use safe send
-            self.node.send_data(target, chunk_id)
-            processed += 1
+            size = len(self.node.data_store.get(chunk_id, b"")) + HEADER_SIZE
+            
+            while targets and budget > 0:
+                batches.setdefault(targets.pop(0), []).append(chunk_id)
+                budget -= size
             
             if not targets:
                 del self.pending_push[chunk_id]
+            if budget <= 0:
+                break
+        
+        if batches:
+            self.node.send_data_batch(batches)
                 
 
 class RarestFirstAlgorithm(DefaultPushAlgorithm):
@@ -125,54 +231,28 @@ class RarestFirstAlgorithm(DefaultPushAlgorithm):
     def __init__(self, node):
         super().__init__(node)
         self.pull_window = 50 # Look ahead K chunks
-        
-    def handle_packet(self, packet: Packet, addr: tuple) -> bool:
-        """
-        Intercept REQUEST to perform Deduplication (ALGO.md 3.2.3)
-        """
-        if packet.msg_type == P2P.TYPE_REQUEST:
-            try:
-                seq_requested = int(packet.payload.decode('utf-8'))
-                
-                # Critical Dedup: Check if this chunk was already queued to be PUSHED to this peer
-                # If so, remove from Push queue (because we are about to send it as Response)
-                if seq_requested in self.pending_push:
-                    targets = self.pending_push[seq_requested]
-                    if addr in targets:
-                        # logger.debug(f"Dedup: Peer {addr} requested chunk {seq_requested} which was in Push Queue. Promoting.")
-                        targets.remove(addr)
-                        if not targets:
-                            del self.pending_push[seq_requested]
-                            
-                # Let P2PNode handle the actual send_data
-                return False 
-            except:
-                pass
-        
-        return super().handle_packet(packet, addr)
 
-    
+    def on_start(self):
+        # Compile the rarity kernel now rather than on the first tick with real data
+        rarest_chunks(np.zeros((1, 1), dtype='<u8'), np.zeros(1, dtype='<u8'), 1)
+        
     def on_tick(self):
         # 1. Run Default Push Logic first
         super().on_tick()
 
         # 2. Run Pull Logic (Rarest First)
         # Use Scheduler-like logic but specifically for Rarest First
-        current_bitmap = self.node.my_bitmap
-        if not current_bitmap:
+        max_chunk = self.node.max_chunk_seq
+        if max_chunk < 0:
             return
 
         # Simple Playback Head estimation: Max chunk - 5? 
         # Or just look at missing chunks in the known range.
         # Let's target missing chunks in the [Max-Window, Max] range for now as a heuristic of 'relevant' chunks.
-        max_chunk = max(current_bitmap)
         start_scan = max(0, max_chunk - self.pull_window)
         end_scan = max_chunk + 10 # Look a bit ahead too
         
-        needed_chunks = set()
-        for i in range(start_scan, end_scan):
-            if i not in current_bitmap:
-                needed_chunks.add(i)
+        needed_chunks = list(self.node.iter_missing(start_scan, end_scan))
         
         if not needed_chunks:
             return
@@ -182,34 +262,27 @@ class RarestFirstAlgorithm(DefaultPushAlgorithm):
         if not peers:
             return
             
-        rarity_map = {} # chunk_id -> list of owners
-        for c in needed_chunks:
-            owners = []
-            for addr, peer in peers.items():
-                if c in peer.remote_bitmap:
-                    owners.append(addr)
-            if owners:
-                rarity_map[c] = owners
-        
-        # Sort by rarity (fewest owners first)
-        sorted_chunks = sorted(rarity_map.keys(), key=lambda c: len(rarity_map[c]))
+        # Pack every peer's bitmap for the window once ([n_peers, n_words]) plus a mask of what I need
+        peer_addrs = list(peers.keys())
+        base = needed_chunks[0] & ~63
+        n_words = ((needed_chunks[-1] - base) >> 6) + 1
+        peer_matrix = np.stack([peer.remote_bitmap.words_in_range(base, n_words) for peer in peers.values()])
+        need_bits = np.zeros(n_words * 64, dtype=np.uint8)
+        need_bits[np.asarray(needed_chunks) - base] = 1
+        need = np.packbits(need_bits, bitorder='little').view('<u8')
         
-        # Request top K rarest
+        # Request top K rarest (fewest owners first, skipping chunks nobody has)
         limit_requests = 5
-        sent_requests = 0
-        
-        for c in sorted_chunks:
-            owners = rarity_map[c]
-            target = random.choice(owners)
+        by_target = {}
+        for off in rarest_chunks(peer_matrix, need, limit_requests):
+            off = int(off)
+            owners = np.flatnonzero((peer_matrix[:, off >> 6] >> np.uint64(off & 63)) & np.uint64(1))
+            target = peer_addrs[random.choice(owners)]
+            by_target.setdefault(target, []).append(base + off)
             
-            # Send Request
-            payload = str(c).encode('utf-8')
-            packet = Packet(ver=1, msg_type=P2P.TYPE_REQUEST, seq=0, timestamp=time.time(), payload=payload)
-            self.node.transport.send_packet(packet, target)
-            sent_requests += 1
-            
-            if sent_requests >= limit_requests:
-                break
+        # Send Requests (one REQUEST per target)
+        if by_target:
+            self.node.send_requests(by_target)
 
 class EDFAlgorithm(DefaultPushAlgorithm):
     """
@@ -220,61 +293,37 @@ class EDFAlgorithm(DefaultPushAlgorithm):
         super().__init__(node)
         self.pull_window = 50
         
-    def handle_packet(self, packet: Packet, addr: tuple) -> bool:
-        """
-        Intercept REQUEST to perform Deduplication (ALGO.md 3.2.3)
-        Similar to RarestFirstAlgorithm.
-        """
-        if packet.msg_type == P2P.TYPE_REQUEST:
-            try:
-                seq_requested = int(packet.payload.decode('utf-8'))
-                if seq_requested in self.pending_push:
-                    targets = self.pending_push[seq_requested]
-                    if addr in targets:
-                        targets.remove(addr)
-                        if not targets:
-                            del self.pending_push[seq_requested]
-                return False 
-            except:
-                pass
-        
-        return super().handle_packet(packet, addr)
-
-    
     def on_tick(self):
         # 1. Run Push
         super().on_tick()
         
         # 2. Run Pull (EDF)
-        current_bitmap = self.node.my_bitmap
-        if not current_bitmap:
+        max_chunk = self.node.max_chunk_seq
+        if max_chunk < 0:
             return
             
         # Estimate Playback deadline. 
         # We need the "Next Missing Chunk" after the continuous block.
         # Simple heuristic: Start from min(bitmap) or (max - buffer_size).
         # Let's assume we are playing near max-delay
-        max_chunk = max(current_bitmap)
         start_scan = max(0, max_chunk - self.pull_window)
         
         # Find FIRST missing chunk (Earliest Deadline)
         target_chunk = -1
-        for i in range(start_scan, max_chunk + 10):
-            if i not in current_bitmap:
-                # Check if anyone has it
-                peers = self.node.peer_manager.get_active_peers()
-                owners = [addr for addr, p in peers.items() if i in p.remote_bitmap]
-                if owners:
-                    target_chunk = i
-                    target_peer = random.choice(owners)
-                    
-                    # Send Request IMMEDIATELY and stop (EDF focuses on the most urgent)
-                    payload = str(target_chunk).encode('utf-8')
-                    packet = Packet(ver=1, msg_type=P2P.TYPE_REQUEST, seq=0, timestamp=time.time(), payload=payload)
-                    self.node.transport.send_packet(packet, target_peer)
-                    
-                    # logger.debug(f"EDF: Urgent Request {target_chunk} from {target_peer}")
-                    return # Only request the most urgent one per tick? Or a few?
-                    # algo says "break # 只请求最急的一个"
+        peers = self.node.peer_manager.get_active_peers()
+        if not peers:
+            return
+        for i in self.node.iter_missing(start_scan, max_chunk + 10):
+            # Check if anyone has it
+            target_peer = pick_random_owner(i, peers)
+            if target_peer is not None:
+                target_chunk = i
+                
+                # Send Request IMMEDIATELY and stop (EDF focuses on the most urgent)
+                self._send_request(target_chunk, target_peer)
+                
+                # logger.debug(f"EDF: Urgent Request {target_chunk} from {target_peer}")
+                return # Only request the most urgent one per tick? Or a few?
+                # algo says "break # 只请求最急的一个"
         
 
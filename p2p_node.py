@@ -4,30 +4,97 @@ import json
 import logging
 import random
 import socket
-from typing import Set, Dict, Optional
-
-from protocol import Packet
-from transport import UDPTransport
-from peer_manager import PeerManager
+import struct
+from bisect import bisect_left
+from typing import Set, Dict, List, Optional
+
+from protocol import Packet, HEADER_SIZE
+from transport import UDPTransport, addr_key
+from peer_manager import PeerManager, PeerBitmap
+from chunk_store import ChunkStore, ChunkSet
+from stats_manager import StatsManager
 import p2p_protocol as P2P
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
+# How far below max_chunk_seq missing chunk ids are tracked (covers the pull algorithms' window)
+MISSING_WINDOW = 64
+# Seconds a get_best_ip_for_peer result is reused before probing the route again
+MY_IP_TTL = 60.0
+# Received packets waiting for dispatch, split over RX_WORKERS per-peer shards
+RX_QUEUE_SIZE = 10000
+RX_WORKERS = 4
+_PONG_TYPE = bytes([P2P.TYPE_PONG])
+# Seconds during which a second handshake to the same address is suppressed
+HANDSHAKE_PENDING_TTL = 5.0
+# Seconds a peer stays off the unicast fallback after we last heard it on the multicast group
+MCAST_CONFIRM_TTL = 5.0
+
+def _dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode('utf-8')
+
+def _loads(payload):
+    if orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(bytes(payload))
+
 class P2PNode:
-    def __init__(self, host: str, port: int, role: str = "viewer", algo_name: str = "default", initial_chunks: Optional[Set[int]] = None):
+    def __init__(self, host: str, port: int, role: str = "viewer", algo_name: str = "default", initial_chunks: Optional[Set[int]] = None,
+                 multicast: Optional[tuple] = None):
         self.host = host
         self.port = port
         self.role = role
-        self.my_bitmap: Set[int] = initial_chunks if initial_chunks else set()
-        self.data_store: Dict[int, bytes] = {} # seq -> data
+        # (group, port): LAN-only swarms send BITMAP/HEARTBEAT once to this group instead of to each peer
+        self.multicast = multicast
+        self.my_bitmap: ChunkSet = ChunkSet(initial_chunks or ())
+        self.data_store = ChunkStore(on_evict=self._on_chunks_evicted) # seq -> data
+        self.frame_chunks: Dict[int, List[int]] = {} # frame_id -> chunk ids (filled by the broadcaster, used for eviction)
         
         # Initialize data_store with dummy data for initial chunks
         for seq in self.my_bitmap:
             self.data_store[seq] = f"Data-{seq}".encode()
 
+        # Highest chunk id stored so far, plus the sorted ids just below it that are still missing
+        self.max_chunk_seq = self.my_bitmap.max() if self.my_bitmap else -1
+        self.missing_chunks: List[int] = [
+            i for i in range(max(0, self.max_chunk_seq - MISSING_WINDOW), self.max_chunk_seq)
+            if i not in self.my_bitmap
+        ]
+
+        self._stats = StatsManager() # process-wide singleton
+        self._my_ip_cache: Dict[str, tuple] = {} # peer /24 prefix -> (my ip, expiry)
+        self._pending_handshakes: Dict[tuple, float] = {} # addr -> monotonic time the suppression ends
+        self._local_ips: Set[str] = set() # our own addresses, filled in when multicast is joined
+        self._mcast_senders: Dict[tuple, tuple] = {} # group source addr -> peer addr
+        self._mcast_confirmed: Dict[tuple, float] = {} # peer addr -> monotonic time it falls back to unicast
         self.transport = UDPTransport(on_packet_received=self.handle_packet)
+        self.transport.raw_handlers[P2P.TYPE_HEARTBEAT] = self._on_heartbeat_raw
+        self._handlers = {
+            P2P.TYPE_HANDSHAKE: self._on_handshake,
+            P2P.TYPE_PEER_LIST: self._on_peer_list,
+            P2P.TYPE_PING: self._on_ping,
+            P2P.TYPE_PONG: self._on_pong,
+            P2P.TYPE_BITMAP: self._on_bitmap,
+            P2P.TYPE_REQUEST: self._on_request,
+            P2P.TYPE_DATA: self._on_data,
+            P2P.TYPE_STATS_REPORT: self._on_stats_report,
+        }
+        self._rx_queues = [asyncio.Queue(maxsize=RX_QUEUE_SIZE // RX_WORKERS) for _ in range(RX_WORKERS)]
+        self._tasks: List[asyncio.Task] = []
+        self.rx_dropped = 0
+        self.dup_chunks = 0
         self.peer_manager = PeerManager()
         self.running = False
+
+        # Optional consumer queue (set by viewer_loop): every newly stored chunk id is put here
+        self.new_chunk_queue: Optional[asyncio.Queue] = None
         
         # Initialize Algorithm Strategy
         from p2p_algorithms import SplitterAlgorithm, DefaultPushAlgorithm, RarestFirstAlgorithm, EDFAlgorithm
@@ -45,242 +112,385 @@ class P2PNode:
         logger.info(f"Initialized P2PNode with algorithm: {self.algorithm.__class__.__name__}")
 
     async def start(self):
+        """
+        Binds the socket and starts the background loops. Runs on any asyncio loop;
+        main.py installs uvloop when it's available.
+        """
         self.running = True
         await self.transport.start_server(self.host, self.port)
         logger.info(f"P2PNode started on {self.host}:{self.port}")
+        if self.multicast:
+            try:
+                await self.transport.join_multicast(*self.multicast, self._on_multicast_packet)
+                self._local_ips = self._find_local_ips()
+            except OSError as e:
+                logger.warning(f"Multicast {self.multicast} unavailable, using unicast: {e}")
+                self.multicast = None
         
         self.algorithm.on_start()
         
         # Start background tasks
-        asyncio.create_task(self.loop_heartbeat())
-        asyncio.create_task(self.loop_broadcast_bitmap())
-        asyncio.create_task(self.loop_algorithm_tick()) # REPLACES loop_schedule_fetch
-        asyncio.create_task(self.loop_prune_peers())
-        asyncio.create_task(self.loop_pex())
+        self._tasks = [asyncio.create_task(self._rx_worker(q)) for q in self._rx_queues]
+        self._tasks.append(asyncio.create_task(self.loop_heartbeat()))
+        self._tasks.append(asyncio.create_task(self.loop_broadcast_bitmap()))
+        self._tasks.append(asyncio.create_task(self.loop_algorithm_tick())) # REPLACES loop_schedule_fetch
+        self._tasks.append(asyncio.create_task(self.loop_prune_peers()))
+        self._tasks.append(asyncio.create_task(self.loop_pex()))
         if self.role == "viewer":
-            asyncio.create_task(self.loop_report_stats())
+            self._tasks.append(asyncio.create_task(self.loop_report_stats()))
 
 
     async def stop(self):
         self.running = False
+        # Stop every loop before the socket goes away, so none of them sends on a closed transport
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
         self.transport.close()
 
     def connect_to(self, host: str, port: int):
         """
         Manually send a handshake to a known peer to bootstrap connection.
         """
-        payload = json.dumps({"role": self.role}).encode('utf-8')
+        if not self._claim_handshake((host, port)):
+            return
+        self.transport.send_raw(self._handshake_packet(), (host, port))
+        logger.info(f"Sent Handshake to {host}:{port} as {self.role}")
+
+    def _claim_handshake(self, addr: tuple) -> bool:
+        """
+        False if a handshake to addr went out less than HANDSHAKE_PENDING_TTL ago
+        (e.g. the same new peer named by back-to-back PEX lists), else records this one.
+        """
+        now = time.monotonic()
+        if self._pending_handshakes.get(addr, 0.0) > now:
+            return False
+        self._pending_handshakes[addr] = now + HANDSHAKE_PENDING_TTL
+        return True
+
+    def _handshake_packet(self) -> bytes:
+        payload = bytes([P2P.role_code(self.role)])
         packet = Packet(
-            ver=1,
+            ver=P2P.PROTOCOL_VERSION,
             msg_type=P2P.TYPE_HANDSHAKE,
             seq=0,
             timestamp=time.time(),
             payload=payload
         )
-        self.transport.send_packet(packet, (host, port))
-        logger.info(f"Sent Handshake to {host}:{port} as {self.role}")
+        return packet.pack()
+
+    def store_chunk(self, seq: int, payload: bytes):
+        """
+        Stores a chunk, marks it available and notifies new_chunk_queue if set
+        (dropping the oldest queued id when a bounded queue is full).
+        """
+        self.my_bitmap.add(seq)
+        self.data_store[seq] = payload
+
+        missing = self.missing_chunks
+        if seq > self.max_chunk_seq:
+            missing.extend(range(max(self.max_chunk_seq + 1, seq - MISSING_WINDOW), seq))
+            self.max_chunk_seq = seq
+            cut = bisect_left(missing, seq - MISSING_WINDOW)
+            if cut:
+                del missing[:cut]
+        else:
+            i = bisect_left(missing, seq)
+            if i < len(missing) and missing[i] == seq:
+                del missing[i]
+
+        queue = self.new_chunk_queue
+        if queue is not None:
+            if queue.full():
+                # Consumer fell behind: drop the oldest id, it's the least useful one for playback
+                queue.get_nowait()
+            queue.put_nowait(seq)
+
+    def _on_chunks_evicted(self, seqs: List[int]):
+        # Frames pushed out of the store's ring must not be advertised any more
+        self.my_bitmap.difference_update(seqs)
+
+    def iter_missing(self, start: int, end: int):
+        """
+        Yields the chunk ids in [start, end) I don't have, in ascending order.
+        Ids above max_chunk_seq are always missing.
+        """
+        missing = self.missing_chunks
+        i = bisect_left(missing, start)
+        while i < len(missing) and missing[i] < end:
+            yield missing[i]
+            i += 1
+        yield from range(max(start, self.max_chunk_seq + 1), end)
 
     def handle_packet(self, packet: Packet, addr: tuple):
         """
-        Callback from UDPTransport. Dispatches based on msg_type.
+        Callback from UDPTransport. Records liveness, answers heartbeats and queues
+        everything else for the rx workers (same peer -> same worker, so order is kept).
         """
         # Always update peer liveness
         self.peer_manager.update_peer(addr)
         
-        # DELEGATE TO ALGORITHM FIRST
-        if self.algorithm.handle_packet(packet, addr):
+        # HEARTBEAT (via multicast; unicast ones take _on_heartbeat_raw): liveness is
+        # recorded above, a timestamped one doubles as a PING
+        if packet.msg_type == P2P.TYPE_HEARTBEAT:
+            if packet.payload:
+                self._on_ping(packet, addr)
             return
 
-        if packet.msg_type == P2P.TYPE_HANDSHAKE:
-            # Parse Role if present
-            try:
-                if packet.payload:
-                    data = json.loads(packet.payload.decode('utf-8'))
-                    remote_role = data.get("role", "viewer")
-                    self.peer_manager.update_peer(addr, role=remote_role)
-                else:
-                    self.peer_manager.update_peer(addr, role="viewer")
-            except:
-                self.peer_manager.update_peer(addr, role="viewer")
+        # Duplicate DATA (common when several peers push the same chunk): drop before queueing
+        if packet.msg_type == P2P.TYPE_DATA and packet.seq in self.my_bitmap:
+            self.dup_chunks += 1
+            return
 
-            logger.info(f"Received HANDSHAKE from {addr}")
-            # Reply with bitmap so they know what we have immediately
-            self.send_bitmap(addr)
-            
-            # PEX: If we are broadcaster, send our peer list to the new joiner immediately
-            if self.role == "broadcaster":
-                self.send_peer_list(addr)
-            
-            self.algorithm.on_peer_discovered(addr)
+        # Everything else is dispatched by the rx workers, so this callback returns
+        # quickly and the transport keeps draining the socket during bursts
+        queue = self._rx_queues[hash(addr) % RX_WORKERS]
+        if queue.full():
+            self.rx_dropped += 1
+            logger.debug(f"RX queue full, dropped packet type {packet.msg_type} from {addr}")
+            return
+        queue.put_nowait((packet, addr))
 
+    def _on_heartbeat_raw(self, data: bytes, addr: tuple):
+        """
+        Transport fast path for HEARTBEAT, no Packet built: refresh liveness and, if it
+        carries a timestamp, echo it back as a PONG (same bytes, msg_type swapped).
+        """
+        self.peer_manager.update_peer(addr)
+        if len(data) > HEADER_SIZE:
+            self.transport.send_raw(data[:1] + _PONG_TYPE + data[2:], addr)
 
-        elif packet.msg_type == P2P.TYPE_PEER_LIST:
+    async def _rx_worker(self, queue: asyncio.Queue):
+        while self.running:
+            packet, addr = await queue.get()
             try:
-                # Payload: [[host, port, role], ...]
-                peers_list = json.loads(packet.payload.decode('utf-8'))
-                
-                count_new = 0
-                for host, port, role in peers_list:
-                    if port == self.port: 
-                        continue
-                    
-                    if host.startswith("127.") or host == "0.0.0.0" or host == "localhost":
-                         pass
-
-                    if (host, port) not in self.peer_manager.peers:
-                        logger.info(f"PEX: Discovered new peer {host}:{port} ({role}). Connecting...")
-                        self.connect_to(host, port)
-                        count_new += 1
-                    else:
-                        self.peer_manager.update_peer((host, port), role=role)
-                        
-                if count_new > 0:
-                    logger.info(f"PEX: Connected to {count_new} new peers.")
+                self._dispatch(packet, addr)
             except Exception as e:
-                logger.error(f"PEX parse error from {addr}: {e}")
-
-        elif packet.msg_type == P2P.TYPE_PING:
-            try:
-                pong = Packet(ver=1, msg_type=P2P.TYPE_PONG, seq=0, timestamp=time.time(), payload=packet.payload)
-                self.transport.send_packet(pong, addr)
-            except:
-                pass
+                logger.error(f"Error handling packet type {packet.msg_type} from {addr}: {e}")
 
-        elif packet.msg_type == P2P.TYPE_PONG:
-            try:
-                sent_time = float(packet.payload.decode('utf-8'))
-                rtt = time.time() - sent_time
-                if addr in self.peer_manager.peers:
-                    self.peer_manager.peers[addr].update_rtt(rtt)
-            except:
-                pass
+    def _dispatch(self, packet: Packet, addr: tuple):
+        # DELEGATE TO ALGORITHM FIRST
+        if self.algorithm.handle_packet(packet, addr):
+            return
 
-        elif packet.msg_type == P2P.TYPE_HEARTBEAT:
-            pass
+        handler = self._handlers.get(packet.msg_type)
+        if handler:
+            handler(packet, addr)
 
-        elif packet.msg_type == P2P.TYPE_BITMAP:
-            try:
-                data = json.loads(packet.payload.decode('utf-8'))
-                new_set = set()
-                if isinstance(data, list) and len(data) > 0 and isinstance(data[0], list):
-                    for s, e in data:
-                        new_set.update(range(s, e + 1))
-                else:
-                    new_set = set(data)
-                
-                self.peer_manager.update_bitmap(addr, new_set)
-            except Exception as e:
-                logger.error(f"Bitmap parse error {addr}: {e}")
+    def _on_handshake(self, packet: Packet, addr: tuple):
+        # Parse Role if present
+        try:
+            if packet.payload and packet.ver >= 2:
+                self.peer_manager.update_peer(addr, role=P2P.role_name(packet.payload[0]))
+            elif packet.payload:
+                data = _loads(packet.payload)
+                remote_role = data.get("role", "viewer")
+                self.peer_manager.update_peer(addr, role=remote_role)
+            else:
+                self.peer_manager.update_peer(addr, role="viewer")
+        except:
+            self.peer_manager.update_peer(addr, role="viewer")
 
-        elif packet.msg_type == P2P.TYPE_REQUEST:
-            try:
-                seq_requested = int(packet.payload.decode('utf-8'))
-                if seq_requested in self.data_store:
-                    self.send_data(addr, seq_requested)
-                else:
-                    logger.warning(f"Peer {addr} requested chunk {seq_requested} which I don't have.")
-            except Exception as e:
-                logger.error(f"Failed to handle request from {addr}: {e}")
+        logger.info(f"Received HANDSHAKE from {addr}")
+        # Reply with bitmap so they know what we have immediately
+        self.send_bitmap(addr)
+        
+        # PEX: If we are broadcaster, send our peer list to the new joiner immediately
+        if self.role == "broadcaster":
+            self.send_peer_list(addr)
+        
+        self.algorithm.on_peer_discovered(addr)
 
-        elif packet.msg_type == P2P.TYPE_DATA:
-            seq = packet.seq
-            if seq not in self.my_bitmap:
-                self.data_store[seq] = packet.payload
-                self.my_bitmap.add(seq)
-                
-                from stats_manager import StatsManager
-                src_str = f"{addr[0]}:{addr[1]}"
-                StatsManager().add_download(len(packet.payload), source=src_str)
-                
-                logger.info(f"Received DATA chunk {seq} from {addr}")
-                
-                # TRIGGER ALGORITHM HOOK (For Flooding/Push)
-                self.algorithm.on_chunk_received(seq, packet.payload, addr)
-                
+    def _on_peer_list(self, packet: Packet, addr: tuple):
+        try:
+            # Payload: [[host, port, role], ...]
+            if packet.ver >= 2:
+                peers_list = P2P.decode_peer_list(packet.payload)
             else:
-                logger.debug(f"Received duplicate chunk {seq} from {addr}")
+                peers_list = _loads(packet.payload)
+            received = {(host, port): role for host, port, role in peers_list if port != self.port}
+            known = self.peer_manager.peers
+            
+            for peer_addr in received.keys() & known.keys():
+                self.peer_manager.update_peer(peer_addr, role=received[peer_addr])
+
+            new_addrs = [a for a in received.keys() - known.keys() if self._claim_handshake(a)]
+            if new_addrs:
+                handshake = self._handshake_packet()
+                self.transport.send_many({peer_addr: [handshake] for peer_addr in new_addrs})
+                logger.info(f"PEX: Sent handshakes to {len(new_addrs)} new peers: {sorted(new_addrs)}")
+        except Exception as e:
+            logger.error(f"PEX parse error from {addr}: {e}")
+
+    def _on_ping(self, packet: Packet, addr: tuple):
+        try:
+            pong = Packet(ver=packet.ver, msg_type=P2P.TYPE_PONG, seq=0, timestamp=time.time(), payload=packet.payload)
+            self.transport.send_packet(pong, addr)
+        except:
+            pass
 
-        elif packet.msg_type == P2P.TYPE_STATS_REPORT:
-            try:
-                from stats_manager import StatsManager
-                report = json.loads(packet.payload.decode('utf-8'))
-                addr_str = f"{addr[0]}:{addr[1]}"
-                StatsManager().record_peer_report(addr_str, report)
-            except Exception as e:
-                logger.error(f"Stats report parse error {addr}: {e}")
+    def _on_pong(self, packet: Packet, addr: tuple):
+        try:
+            sent_time = P2P.parse_ping_time(packet)
+            self.peer_manager.update_rtt(addr, time.time() - sent_time)
+        except:
+            pass
 
-    def send_bitmap(self, addr: tuple):
-        if not self.my_bitmap:
-            payload = b"[]"
-        else:
-            sorted_chunks = sorted(list(self.my_bitmap))
-            ranges = []
-            if sorted_chunks:
-                start = sorted_chunks[0]
-                prev = sorted_chunks[0]
-                for x in sorted_chunks[1:]:
-                    if x == prev + 1:
-                        prev = x
-                    else:
-                        ranges.append([start, prev])
-                        start = x
-                        prev = x
-                ranges.append([start, prev])
-            
-            if len(ranges) > 50:
-                ranges = ranges[-50:]
-            
-            payload = json.dumps(ranges).encode('utf-8')
-        
+    def _on_bitmap(self, packet: Packet, addr: tuple):
         try:
-            packet = Packet(
-                ver=1, msg_type=P2P.TYPE_BITMAP, seq=0, 
-                timestamp=time.time(), payload=payload
-            )
-            self.transport.send_packet(packet, addr)
-        except ValueError as e:
-            logger.error(f"Bitmap send error {addr}: {e}")
+            if packet.ver >= 2:
+                new_bitmap = PeerBitmap.from_ranges(P2P.decode_ranges(packet.payload))
+            else:
+                data = _loads(packet.payload)
+                if isinstance(data, list) and len(data) > 0 and isinstance(data[0], list):
+                    new_bitmap = PeerBitmap.from_ranges(data)
+                else:
+                    new_bitmap = PeerBitmap.from_ids(data)
+            
+            self.peer_manager.update_bitmap(addr, new_bitmap)
+        except Exception as e:
+            logger.error(f"Bitmap parse error {addr}: {e}")
 
-    def send_peer_list(self, addr: tuple):
-        peers = self.peer_manager.get_active_peers()
-        peer_list_data = []
-        for p_addr, peer in peers.items():
-            peer_list_data.append([peer.host, peer.port, peer.role])
-        
-        my_ip = self.get_best_ip_for_peer(addr[0])
-        peer_list_data.append([my_ip, self.port, self.role])
+    def _on_request(self, packet: Packet, addr: tuple):
+        try:
+            seqs = P2P.parse_request(packet)
+            have = [seq for seq in seqs if seq in self.data_store]
+            if have:
+                self.send_data_batch({addr: have})
+            if len(have) < len(seqs):
+                missing = [seq for seq in seqs if seq not in self.data_store]
+                logger.warning(f"Peer {addr} requested chunks {missing} which I don't have.")
+        except Exception as e:
+            logger.error(f"Failed to handle request from {addr}: {e}")
+
+    def _on_data(self, packet: Packet, addr: tuple):
+        seq = packet.seq
+        if seq not in self.my_bitmap:
+            # The only copy of the payload: it's a view into the received datagram
+            payload = bytes(packet.payload)
+            self.store_chunk(seq, payload)
+            
+            self._stats.add_download(len(payload), source=addr_key(addr))
+            
+            logger.info(f"Received DATA chunk {seq} from {addr}")
+            
+            # TRIGGER ALGORITHM HOOK (For Flooding/Push)
+            self.algorithm.on_chunk_received(seq, payload, addr)
+            
+        else:
+            # Became a duplicate while queued
+            self.dup_chunks += 1
 
-        payload = json.dumps(peer_list_data).encode('utf-8')
-        packet = Packet(ver=1, msg_type=P2P.TYPE_PEER_LIST, seq=0, timestamp=time.time(), payload=payload)
-        self.transport.send_packet(packet, addr)
+    def _on_stats_report(self, packet: Packet, addr: tuple):
+        try:
+            report = _loads(packet.payload)
+            addr_str = f"{addr[0]}:{addr[1]}"
+            self._stats.record_peer_report(addr_str, report)
+        except Exception as e:
+            logger.error(f"Stats report parse error {addr}: {e}")
+
+    def _on_multicast_packet(self, packet: Packet, addr: tuple):
+        # The group may also carry our own packets and other swarms': only known peers count
+        if packet.msg_type not in (P2P.TYPE_BITMAP, P2P.TYPE_HEARTBEAT):
+            return
+        peer_addr = self._multicast_sender(addr)
+        if peer_addr is None:
+            return
+        self._mcast_confirmed[peer_addr] = time.monotonic() + MCAST_CONFIRM_TTL
+        self.handle_packet(packet, peer_addr)
 
-    def get_best_ip_for_peer(self, peer_ip: str) -> str:
-        if peer_ip == "127.0.0.1" or peer_ip == "localhost":
-            return "127.0.0.1"
-        
-        s = None
+    def _multicast_sender(self, addr: tuple) -> Optional[tuple]:
+        """
+        Maps a group packet's source to the peer it came from, or None for our own packets and strangers.
+        The source is the sender's outgoing interface IP, which can differ from the address the peer
+        is known under (127.0.0.1, another interface): a peer on this host is matched by its port.
+        """
+        peers = self.peer_manager.peers
+        if addr in peers:
+            return addr
+        peer_addr = self._mcast_senders.get(addr)
+        if peer_addr in peers:
+            return peer_addr
+        ip, port = addr
+        if ip not in self._local_ips or port == self.port:
+            return None
+        for peer_addr in peers:
+            if peer_addr[1] == port and (peer_addr[0] in self._local_ips or peer_addr[0] == "localhost"):
+                self._mcast_senders[addr] = peer_addr
+                return peer_addr
+        return None
+
+    def _find_local_ips(self) -> Set[str]:
+        """
+        Our own IPv4 addresses: loopback, the bind address, the hostname's and the route to the group.
+        """
+        ips = {"127.0.0.1"}
+        if self.host not in ("", "0.0.0.0"):
+            ips.add(self.host)
         try:
-            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            s.connect((peer_ip, 1))
-            return s.getsockname()[0]
-        except:
-            return "0.0.0.0" 
-        finally:
-            if s: s.close()
+            ips.update(socket.gethostbyname_ex(socket.gethostname())[2])
+        except OSError:
+            pass
+        ips.add(self.get_best_ip_for_peer(self.multicast[0]))
+        ips.discard("0.0.0.0")
+        return ips
 
-    def send_data(self, addr: tuple, seq: int):
-        data = self.data_store.get(seq, b"")
-        packet = Packet(
-            ver=1,
-            msg_type=P2P.TYPE_DATA,
-            seq=seq,
-            timestamp=time.time(),
-            payload=data
-        )
-        self.transport.send_packet(packet, addr)
-        
-        from stats_manager import StatsManager
-        StatsManager().add_upload(len(data))
+    def _send_to_peers(self, data: bytes, peers):
+        """
+        Sends the same serialized packet to every peer: one datagram to the multicast group if enabled,
+        plus unicast to peers not recently heard on the group (other subnet, NAT, no multicast route).
+        """
+        if self.multicast:
+            self.transport.send_raw(data, self.multicast)
+            now = time.monotonic()
+            confirmed = self._mcast_confirmed
+            peers = [addr for addr in peers if confirmed.get(addr, 0.0) <= now]
+            if not peers:
+                return
+        self.transport.send_many({addr: [data] for addr in peers})
+
+    def send_requests(self, by_peer: Dict[tuple, List[int]]):
+        """
+        Sends one REQUEST per peer carrying all the chunk seqs wanted from it.
+        Seqs are split over several packets only if they'd exceed MAX_REQUEST_SEQS.
+        """
+        now = time.time()
+        packets_by_addr = {}
+        for addr, seqs in by_peer.items():
+            packets_by_addr[addr] = [
+                Packet(
+                    ver=P2P.PROTOCOL_VERSION, msg_type=P2P.TYPE_REQUEST, seq=0,
+                    timestamp=now, payload=P2P.request_payload(seqs[i:i + P2P.MAX_REQUEST_SEQS])
+                ).pack()
+                for i in range(0, len(seqs), P2P.MAX_REQUEST_SEQS)
+            ]
+            logger.debug(f"Requested chunks {seqs} from {addr}")
+        self.transport.send_many(packets_by_addr)
+
+    def send_data_batch(self, batches: Dict[tuple, List[int]]):
+        """
+        Sends DATA for several chunks per target with a single transport.send_many call.
+        """
+        packed = {}
+        payload_bytes = 0
+        packets_by_addr = {}
+        now = time.time()
+        for addr, seqs in batches.items():
+            out = packets_by_addr[addr] = []
+            for seq in seqs:
+                data = packed.get(seq)
+                if data is None:
+                    payload = self.data_store.get(seq, b"")
+                    data = packed[seq] = Packet(
+                        ver=1, msg_type=P2P.TYPE_DATA, seq=seq,
+                        timestamp=now, payload=payload
+                    ).pack()
+                out.append(data)
+                payload_bytes += len(data) - HEADER_SIZE
+        self.transport.send_many(packets_by_addr)
+
+        self._stats.add_upload(payload_bytes)
     
     def send_data_packet(self, addr: tuple, seq: int, payload: bytes):
         packet = Packet(
@@ -291,182 +501,28 @@ class P2PNode:
             payload=payload
         )
         self.transport.send_packet(packet, addr)
-        from stats_manager import StatsManager
-        StatsManager().add_upload(len(payload))
-
-
-        if packet.msg_type == P2P.TYPE_HANDSHAKE:
-            # Parse Role if present
-            try:
-                if packet.payload:
-                    data = json.loads(packet.payload.decode('utf-8'))
-                    remote_role = data.get("role", "viewer")
-                    self.peer_manager.update_peer(addr, role=remote_role)
-                else:
-                    self.peer_manager.update_peer(addr, role="viewer")
-            except:
-                self.peer_manager.update_peer(addr, role="viewer")
-
-            logger.info(f"Received HANDSHAKE from {addr}")
-            # Reply with bitmap so they know what we have immediately
-            self.send_bitmap(addr)
-            
-            # PEX: If we are broadcaster, send our peer list to the new joiner immediately
-            if self.role == "broadcaster":
-                self.send_peer_list(addr)
-
-        elif packet.msg_type == P2P.TYPE_PEER_LIST:
-            try:
-                # Payload: [[host, port, role], ...]
-                peers_list = json.loads(packet.payload.decode('utf-8'))
-                my_addr = (self.host, self.port) # Note: this might be 0.0.0.0, which matches nothing usually.
-                # Better check: Don't connect to self loopback if we are testing locally.
-                
-                count_new = 0
-                for host, port, role in peers_list:
-                    # Ignore self (simple check)
-                    if port == self.port: 
-                        continue
-                    
-                    # Ignore localhost/0.0.0.0 if we got it (should actaually filter at source, but safety here)
-                    if host.startswith("127.") or host == "0.0.0.0" or host == "localhost":
-                         # If we are seemingly local, try to connect to localhost? No, usually bad in prod.
-                         # But for local testing it helps.
-                         pass
-
-                    
-                    # Connect if not already connected
-                    if (host, port) not in self.peer_manager.peers:
-                        logger.info(f"PEX: Discovered new peer {host}:{port} ({role}). Connecting...")
-                        self.connect_to(host, port)
-                        count_new += 1
-                    else:
-                        # Update role if existing
-                        self.peer_manager.update_peer((host, port), role=role)
-                        
-                if count_new > 0:
-                    logger.info(f"PEX: Connected to {count_new} new peers.")
-            except Exception as e:
-                logger.error(f"PEX parse error from {addr}: {e}")
-
-        elif packet.msg_type == P2P.TYPE_PING:
-            # Reply with PONG, echoing the payload (timestamp)
-            try:
-                pong = Packet(ver=1, msg_type=P2P.TYPE_PONG, seq=0, timestamp=time.time(), payload=packet.payload)
-                self.transport.send_packet(pong, addr)
-            except:
-                pass
-
-        elif packet.msg_type == P2P.TYPE_PONG:
-            try:
-                sent_time = float(packet.payload.decode('utf-8'))
-                rtt = time.time() - sent_time
-                if addr in self.peer_manager.peers:
-                    self.peer_manager.peers[addr].update_rtt(rtt)
-                    # logger.debug(f"RTT to {addr}: {rtt*1000:.1f}ms")
-            except:
-                pass
-
-        elif packet.msg_type == P2P.TYPE_HEARTBEAT:
-            # Just updates liveness (handled above)
-            pass
-
-        elif packet.msg_type == P2P.TYPE_BITMAP:
-            try:
-                data = json.loads(packet.payload.decode('utf-8'))
-                new_set = set()
-                # Check for range format [[s, e], ...]
-                if isinstance(data, list) and len(data) > 0 and isinstance(data[0], list):
-                    for s, e in data:
-                        new_set.update(range(s, e + 1))
-                else:
-                    new_set = set(data)
-                
-                self.peer_manager.update_bitmap(addr, new_set)
-            except Exception as e:
-                logger.error(f"Bitmap parse error {addr}: {e}")
+        self._stats.add_upload(len(payload))
 
-        elif packet.msg_type == P2P.TYPE_REQUEST:
-            try:
-                seq_requested = int(packet.payload.decode('utf-8'))
-                if seq_requested in self.data_store:
-                    self.send_data(addr, seq_requested)
-                    logger.info(f"Fulfilled REQUEST for chunk {seq_requested} from {addr}")
-                else:
-                    logger.warning(f"Peer {addr} requested chunk {seq_requested} which I don't have.")
-            except Exception as e:
-                logger.error(f"Failed to handle request from {addr}: {e}")
-
-        elif packet.msg_type == P2P.TYPE_DATA:
-            seq = packet.seq
-            if seq not in self.my_bitmap:
-                self.data_store[seq] = packet.payload
-                self.my_bitmap.add(seq)
-                
-                # Update Stats
-                from stats_manager import StatsManager
-                src_str = f"{addr[0]}:{addr[1]}"
-                StatsManager().add_download(len(packet.payload), source=src_str)
-                
-                logger.info(f"Received DATA chunk {seq} from {addr}")
-                
-                # TRIGGER ALGORITHM HOOK (For Flooding/Push)
-                self.algorithm.on_chunk_received(seq, packet.payload, addr)
-                
-                # Ideally, broadcast new bitmap or just let next periodic broadcast handle it
-            else:
-                logger.debug(f"Received duplicate chunk {seq} from {addr}")
-
-        elif packet.msg_type == P2P.TYPE_STATS_REPORT:
-            try:
-                # Only Broadcaster needs to collect these, but technically anyone running dashboard could.
-                from stats_manager import StatsManager
-                report = json.loads(packet.payload.decode('utf-8'))
-                # Identify peer by the SENDER address, not what they claim?
-                # Actually, report might contain metadata, but addr is source truth.
-                addr_str = f"{addr[0]}:{addr[1]}"
-                StatsManager().record_peer_report(addr_str, report)
-            except Exception as e:
-                logger.error(f"Stats report parse error {addr}: {e}")
-
-
-    def send_bitmap(self, addr: tuple):
+    def _bitmap_packet(self) -> bytes:
         """
-        Sends bitmap using RLE Range Compression: [[start, end], ...]
+        Serialized BITMAP packet: RLE ranges [start, end], varint delta-encoded (see P2P.encode_ranges).
         """
-        if not self.my_bitmap:
-            payload = b"[]"
-        else:
-            sorted_chunks = sorted(list(self.my_bitmap))
-            ranges = []
-            if sorted_chunks:
-                start = sorted_chunks[0]
-                prev = sorted_chunks[0]
-                for x in sorted_chunks[1:]:
-                    if x == prev + 1:
-                        prev = x
-                    else:
-                        ranges.append([start, prev])
-                        start = x
-                        prev = x
-                ranges.append([start, prev])
-            
-            # Limit ranges to safe UDP size (MTU ~1400 safe payload)
-            # Each range is "[xxxx, yyyy]" approx 15 bytes.
-            # 50 ranges * 15 = 750 bytes. Safe.
-            # 200 ranges was ~3000 bytes -> Fragmentation -> Loss on some networks.
-            if len(ranges) > 50:
-                ranges = ranges[-50:]
-            
-            payload = json.dumps(ranges).encode('utf-8')
+        ranges = self.my_bitmap.ranges()
         
+        # Limited to BITMAP_MAX_PAYLOAD bytes (no IP fragmentation); at ~3 bytes per range
+        # that is a few hundred ranges, only the oldest ones get dropped beyond that.
+        payload = P2P.encode_ranges(ranges)
+        
+        packet = Packet(
+            ver=P2P.PROTOCOL_VERSION, msg_type=P2P.TYPE_BITMAP, seq=0, 
+            timestamp=time.time(), payload=payload
+        )
+        return packet.pack()
+
+    def send_bitmap(self, addr: tuple):
         try:
-            packet = Packet(
-                ver=1, msg_type=P2P.TYPE_BITMAP, seq=0, 
-                timestamp=time.time(), payload=payload
-            )
-            self.transport.send_packet(packet, addr)
-        except ValueError as e:
+            self.transport.send_raw(self._bitmap_packet(), addr)
+        except (ValueError, struct.error) as e:
             logger.error(f"Bitmap send error {addr}: {e}")
 
     def send_peer_list(self, addr: tuple):
@@ -480,9 +536,15 @@ class P2PNode:
         my_ip = self.get_best_ip_for_peer(addr[0])
         peer_list_data.append([my_ip, self.port, self.role])
 
-        payload = json.dumps(peer_list_data).encode('utf-8')
-        packet = Packet(ver=1, msg_type=P2P.TYPE_PEER_LIST, seq=0, timestamp=time.time(), payload=payload)
-        self.transport.send_packet(packet, addr)
+        self.transport.send_raw(self._peer_list_packet(peer_list_data, time.time()), addr)
+
+    def _peer_list_packet(self, entries: list, now: float) -> bytes:
+        try:
+            ver, payload = P2P.PROTOCOL_VERSION, P2P.encode_peer_list(entries)
+        except (OSError, ValueError):
+            # Hostname / IPv6 entry: the v1 JSON list can carry any host string
+            ver, payload = 1, _dumps(entries)
+        return Packet(ver=ver, msg_type=P2P.TYPE_PEER_LIST, seq=0, timestamp=now, payload=payload).pack()
 
     def get_best_ip_for_peer(self, peer_ip: str) -> str:
         """
@@ -493,33 +555,28 @@ class P2PNode:
         if peer_ip == "127.0.0.1" or peer_ip == "localhost":
             return "127.0.0.1"
         
+        # Peers in the same /24 are reached through the same local address: probe once per subnet
+        prefix, dot, _ = peer_ip.rpartition(".")
+        key = prefix if dot else peer_ip
+        now = time.monotonic()
+        cached = self._my_ip_cache.get(key)
+        if cached and cached[1] > now:
+            return cached[0]
+
         # Try to find a socket route
         s = None
         try:
             s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
             s.connect((peer_ip, 1)) # Dummy connect
-            return s.getsockname()[0]
+            my_ip = s.getsockname()[0]
         except:
-            return "0.0.0.0" # Fallback
+            return "0.0.0.0" # Fallback, not cached so the next call retries
         finally:
             if s: s.close()
+        self._my_ip_cache[key] = (my_ip, now + MY_IP_TTL)
+        return my_ip
 
 
-    def send_data(self, addr: tuple, seq: int):
-        data = self.data_store.get(seq, b"")
-        packet = Packet(
-            ver=1,
-            msg_type=P2P.TYPE_DATA,
-            seq=seq,
-            timestamp=time.time(),
-            payload=data
-        )
-        self.transport.send_packet(packet, addr)
-        
-        # Update Stats
-        from stats_manager import StatsManager
-        StatsManager().add_upload(len(data))
-
     async def loop_algorithm_tick(self):
         """
         Periodically tick the algorithm (replaces loop_schedule_fetch).
@@ -540,31 +597,20 @@ class P2PNode:
             peers = self.peer_manager.get_active_peers()
             
             # Stats Integration
-            from stats_manager import StatsManager
             # Pass list of (host, port) tuples
-            StatsManager().update_peers(list(peers.keys()))
+            self._stats.update_peers(self.peer_manager.get_peer_addrs())
             
-            # Additional Stats: Avg RTT
-            total_rtt = 0
-            count = 0
-            for p in peers.values():
-                if p.rtt > 0:
-                    total_rtt += p.rtt
-                    count += 1
-            avg_rtt_ms = (total_rtt / count * 1000) if count > 0 else 0
-            StatsManager().update_network_quality(avg_rtt_ms)
+            # Additional Stats: Avg RTT (EWMA kept by PeerManager)
+            self._stats.update_network_quality(self.peer_manager.avg_rtt * 1000)
 
             if not peers:
                 continue
             
-            # Send Heartbeat AND Ping
-            packet_hb = Packet(ver=1, msg_type=P2P.TYPE_HEARTBEAT, seq=0, timestamp=time.time(), payload=b"")
-            payload_ping = str(time.time()).encode('utf-8')
-            packet_ping = Packet(ver=1, msg_type=P2P.TYPE_PING, seq=0, timestamp=time.time(), payload=payload_ping)
+            # Timestamped Heartbeat: keep-alive and RTT probe in one packet (one batch for all peers)
+            now = time.time()
+            packet_hb = Packet(ver=P2P.PROTOCOL_VERSION, msg_type=P2P.TYPE_HEARTBEAT, seq=0, timestamp=now, payload=P2P.ping_payload(now)).pack()
 
-            for addr in peers:
-                self.transport.send_packet(packet_hb, addr)
-                self.transport.send_packet(packet_ping, addr)
+            self._send_to_peers(packet_hb, peers)
 
     async def loop_pex(self):
         """
@@ -596,20 +642,21 @@ class P2PNode:
             # Better strategy: for each neighbor, send specific list? 
             # Or just append "me" dynamically in the send loop.
             
+            # The list only differs in our own entry, which depends on the route to each peer:
+            # encode once per distinct local IP (usually a single one on a LAN)
+            batch = {}
+            encoded = {}
+            now = time.time()
             for addr in peers:
                 try:
-                    # Dynamically add SELF to the list for this specific target
                     my_ip = self.get_best_ip_for_peer(addr[0])
-                    # Copy list
-                    final_list = list(peer_list_data)
-                    final_list.append([my_ip, self.port, self.role])
-                    
-                    payload = json.dumps(final_list).encode('utf-8')
-                    packet = Packet(ver=1, msg_type=P2P.TYPE_PEER_LIST, seq=0, timestamp=time.time(), payload=payload)
-            
-                    self.transport.send_packet(packet, addr)
+                    data = encoded.get(my_ip)
+                    if data is None:
+                        data = encoded[my_ip] = self._peer_list_packet(peer_list_data + [[my_ip, self.port, self.role]], now)
+                    batch[addr] = [data]
                 except:
                     pass
+            self.transport.send_many(batch)
 
     async def loop_broadcast_bitmap(self):
         """
@@ -619,19 +666,25 @@ class P2PNode:
             await asyncio.sleep(0.2) # 5Hz broadcast (Fast Update for P2P)
             
             # Stats Integration
-            from stats_manager import StatsManager
             # Simple summary: "105 chunks (101-205)"
             if self.my_bitmap:
-                min_c = min(self.my_bitmap)
-                max_c = max(self.my_bitmap)
+                min_c = self.my_bitmap.min()
+                max_c = self.my_bitmap.max()
                 summary = f"{len(self.my_bitmap)} chunks ({min_c}-{max_c})"
             else:
                 summary = "0 chunks"
-            StatsManager().update_bitmap(summary)
+            self._stats.update_bitmap(summary)
 
             peers = self.peer_manager.get_active_peers()
-            for addr in peers:
-                self.send_bitmap(addr)
+            if not peers:
+                continue
+            # Same bytes for everyone: encode once per tick
+            try:
+                data = self._bitmap_packet()
+            except (ValueError, struct.error) as e:
+                logger.error(f"Bitmap encode error: {e}")
+                continue
+            self._send_to_peers(data, peers)
 
     async def loop_prune_peers(self):
         while self.running:
@@ -640,6 +693,16 @@ class P2PNode:
             if dead_peers:
                 logger.info(f"Pruned dead peers: {dead_peers}")
 
+            now = time.monotonic()
+            expired = [a for a, until in self._pending_handshakes.items() if until <= now]
+            for a in expired:
+                del self._pending_handshakes[a]
+            expired = [a for a, until in self._mcast_confirmed.items() if until <= now]
+            for a in expired:
+                del self._mcast_confirmed[a]
+            if dead_peers:
+                self._mcast_senders = {src: a for src, a in self._mcast_senders.items() if a in self.peer_manager.peers}
+
     async def loop_schedule_fetch(self):
         """
         Uses P2PScheduler to decide what to fetch.
@@ -649,39 +712,29 @@ class P2PNode:
         scheduler = P2PScheduler()
 
         while self.running:
-            # Check more frequently for lower latency
+            # One sleep per round; the sends below are a single batch, nothing to yield between
             await asyncio.sleep(0.1) 
             
             # Use Scheduler to get fetch plan
             peers = self.peer_manager.get_active_peers()
             requests = scheduler.schedule(self.my_bitmap, peers)
             
+            by_peer: Dict[tuple, List[int]] = {}
             for chunk_id, target_peer in requests:
-                payload = str(chunk_id).encode('utf-8')
-                packet = Packet(
-                    ver=1,
-                    msg_type=P2P.TYPE_REQUEST,
-                    seq=0,
-                    timestamp=time.time(),
-                    payload=payload
-                )
-                self.transport.send_packet(packet, target_peer)
-                logger.debug(f"Requested chunk {chunk_id} from {target_peer}") # Reduced log level
-                
-            # Sleep less to be more responsive
-            await asyncio.sleep(0.05)
+                by_peer.setdefault(target_peer, []).append(chunk_id)
+            if by_peer:
+                self.send_requests(by_peer)
 
     async def loop_report_stats(self):
         """
         Periodically capture local stats and report to the Broadcaster (or bootstrap node).
         """
-        from stats_manager import StatsManager
         
         while self.running:
             await asyncio.sleep(3.0) # Report every 3 seconds
             
             # 1. Get Local Stats
-            stats = StatsManager().get_stats()
+            stats = self._stats.get_stats()
             # Prune complex objects to save bandwidth/complexity?
             # We want: upload/download rates, buffer health, peer count.
             report = {
@@ -694,7 +747,7 @@ class P2PNode:
                 "sources": stats["source_distribution_10s"]
             }
             
-            payload = json.dumps(report).encode('utf-8')
+            payload = _dumps(report)
             packet = Packet(ver=1, msg_type=P2P.TYPE_STATS_REPORT, seq=0, timestamp=time.time(), payload=payload)
             
             # 2. Send to Broadcaster
@@ -1,12 +1,142 @@
 # p2p_protocol.py
+import socket
+import struct
+from typing import List
+
+# Layer 2 protocol version (Packet.ver).
+# v2: TYPE_REQUEST payload is the chunk seq as 4-byte big-endian (v1 sent it as a decimal string)
+#     TYPE_BITMAP payload is varint delta-encoded ranges (v1 sent JSON [[start, end], ...])
+#     TYPE_PING/TYPE_PONG payload is the send time as a big-endian double (v1 sent str(float))
+#     TYPE_HEARTBEAT carries the same timestamp and is answered with a PONG (v1 sent it empty)
+#     TYPE_HANDSHAKE payload is one role byte (v1 sent JSON {"role": ...})
+#     TYPE_PEER_LIST payload is 7-byte entries: IPv4, port, role byte (v1 sent JSON; still used for non-IPv4 hosts)
+# v3: TYPE_REQUEST may carry several chunk seqs (n x uint32); a v2 single-seq payload is the n=1 case
+PROTOCOL_VERSION = 3
+
+# Max BITMAP payload, keeps the datagram well under the MTU (no IP fragmentation)
+BITMAP_MAX_PAYLOAD = 1200
+# Max chunk seqs in one REQUEST (same MTU budget, 4 bytes each)
+MAX_REQUEST_SEQS = BITMAP_MAX_PAYLOAD // 4
 
 # Message Type Constants
 TYPE_HANDSHAKE = 0x01   # New peer joining
-TYPE_HEARTBEAT = 0x02   # Keep-alive
-TYPE_BITMAP    = 0x03   # Broadcast available chunks
-TYPE_REQUEST = 4      # Payload: chunk_seq (int)
+TYPE_HEARTBEAT = 0x02   # Keep-alive (payload: optional PING timestamp)
+TYPE_BITMAP    = 0x03   # Broadcast available chunks (payload: see encode_ranges)
+TYPE_REQUEST = 4      # Payload: chunk_seq(s) (uint32 each, big-endian)
 TYPE_DATA = 5         # Payload: data bytes
-TYPE_PEER_LIST = 6    # Payload: JSON list of [host, port, role]
-TYPE_PING = 7         # Payload: timestamp (float)
-TYPE_PONG = 8         # Payload: echo timestamp (float)
+TYPE_PEER_LIST = 6    # Payload: [host, port, role] entries (see encode_peer_list)
+TYPE_PING = 7         # Payload: timestamp (double, big-endian)
+TYPE_PONG = 8         # Payload: echo of the PING payload
 TYPE_STATS_REPORT = 9 # Payload: JSON stats from peer
+
+def request_payload(seqs: List[int]) -> bytes:
+    return struct.pack(f"!{len(seqs)}I", *seqs)
+
+def parse_request(packet) -> List[int]:
+    """
+    Returns the chunk seqs carried by a TYPE_REQUEST packet (accepts v1 peers too).
+    """
+    if packet.ver < 2:
+        return [int(str(packet.payload, 'utf-8'))]
+    return [seq for (seq,) in _SEQ.iter_unpack(packet.payload)]
+
+_PING = struct.Struct("!d")
+_PEER = struct.Struct("!4sHB")
+_SEQ = struct.Struct("!I")
+
+# Role byte values in HANDSHAKE / PEER_LIST (index into ROLES)
+ROLES = ("viewer", "broadcaster")
+
+def role_code(role: str) -> int:
+    return ROLES.index(role)
+
+def role_name(code: int) -> str:
+    return ROLES[code] if code < len(ROLES) else "viewer"
+
+def encode_peer_list(entries) -> bytes:
+    """
+    Packs (host, port, role) entries. Raises OSError for a host that isn't a dotted IPv4
+    address and ValueError for an unknown role; callers fall back to the v1 JSON form.
+    """
+    return b"".join(
+        _PEER.pack(socket.inet_pton(socket.AF_INET, host), port, role_code(role))
+        for host, port, role in entries
+    )
+
+def decode_peer_list(payload):
+    """
+    Inverse of encode_peer_list: returns a list of (host, port, role) tuples.
+    """
+    return [
+        (socket.inet_ntop(socket.AF_INET, ip), port, role_name(role))
+        for ip, port, role in _PEER.iter_unpack(payload)
+    ]
+
+def ping_payload(t: float) -> bytes:
+    return _PING.pack(t)
+
+def parse_ping_time(packet) -> float:
+    """
+    Returns the send time echoed by a TYPE_PONG packet (or carried by a TYPE_PING).
+    """
+    if packet.ver < 2:
+        return float(str(packet.payload, 'utf-8'))
+    return _PING.unpack(packet.payload)[0]
+
+def _varint(n: int) -> bytes:
+    out = bytearray()
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+def encode_ranges(ranges, limit: int = BITMAP_MAX_PAYLOAD) -> bytes:
+    """
+    Encodes sorted, disjoint inclusive [start, end] ranges as varints:
+    start0, len0-1, then (gap to previous end)-1, len-1 for each following range.
+    If the result would exceed limit bytes, the oldest ranges are dropped.
+    """
+    if not ranges:
+        return b""
+    items = [_varint(ranges[0][0]) + _varint(ranges[0][1] - ranges[0][0])]
+    for (_, prev_end), (start, end) in zip(ranges, ranges[1:]):
+        items.append(_varint(start - prev_end - 1) + _varint(end - start))
+    
+    # Keep the newest ranges that fit; the first kept one is re-encoded with an absolute start
+    total = 0
+    first = len(items)
+    while first > 0:
+        start, end = ranges[first - 1]
+        head = len(_varint(start)) + len(_varint(end - start))
+        if total + head > limit:
+            break
+        total += len(items[first - 1])
+        first -= 1
+    if first == len(items):
+        return b""
+    if first > 0:
+        start, end = ranges[first]
+        items[first] = _varint(start) + _varint(end - start)
+    return b"".join(items[first:])
+
+def decode_ranges(payload: bytes):
+    """
+    Inverse of encode_ranges: returns a list of inclusive (start, end) tuples.
+    """
+    values = []
+    n = shift = 0
+    for b in payload:
+        n |= (b & 0x7F) << shift
+        if b & 0x80:
+            shift += 7
+        else:
+            values.append(n)
+            n = shift = 0
+    ranges = []
+    prev_end = -1
+    for i in range(0, len(values) - 1, 2):
+        start = values[i] if i == 0 else prev_end + 1 + values[i]
+        prev_end = start + values[i + 1]
+        ranges.append((start, prev_end))
+    return ranges
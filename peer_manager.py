@@ -1,5 +1,124 @@
 import time
-from typing import Dict, Set
+from typing import Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+from chunk_store import ChunkSet
+
+_WORD = np.dtype('<u8')
+
+class PeerBitmap:
+    """
+    Packed bit array of chunk ids (64 per little-endian uint64 word), starting at a 64-aligned base id.
+    Supports the set operations the rest of the code uses; bits_in_range gives a numpy view for the hot paths.
+    """
+    __slots__ = ("base", "words", "_count")
+
+    def __init__(self, base: int = 0, words: np.ndarray = None):
+        self.base = base
+        self.words = words if words is not None else np.zeros(0, dtype=_WORD)
+        self._count = None
+
+    @classmethod
+    def from_ranges(cls, ranges: Iterable) -> "PeerBitmap":
+        """
+        Builds a bitmap from inclusive [start, end] ranges (the BITMAP wire format).
+        """
+        ranges = [(int(s), int(e)) for s, e in ranges if e >= s]
+        if not ranges:
+            return cls()
+        base = min(s for s, _ in ranges) & ~63
+        nbits = max(e for _, e in ranges) - base + 1
+        bits = np.zeros((nbits + 63) // 64 * 64, dtype=np.uint8)
+        for s, e in ranges:
+            bits[s - base:e - base + 1] = 1
+        return cls(base, np.packbits(bits, bitorder='little').view(_WORD))
+
+    @classmethod
+    def from_ids(cls, ids: Iterable[int]) -> "PeerBitmap":
+        return cls.from_ranges((i, i) for i in ids)
+
+    def add(self, i: int):
+        if not len(self.words):
+            self.base = i & ~63
+        if i < self.base:
+            shift = (self.base - (i & ~63)) >> 6
+            self.words = np.concatenate([np.zeros(shift, dtype=_WORD), self.words])
+            self.base -= shift * 64
+        w = (i - self.base) >> 6
+        if w >= len(self.words):
+            self.words = np.concatenate([self.words, np.zeros(w + 1 - len(self.words), dtype=_WORD)])
+        self.words[w] |= np.uint64(1) << np.uint64((i - self.base) & 63)
+        self._count = None
+
+    def bits_in_range(self, lo: int, hi: int) -> np.ndarray:
+        """
+        Returns a uint8 vector with one 0/1 entry per chunk id in [lo, hi).
+        """
+        out = np.zeros(max(0, hi - lo), dtype=np.uint8)
+        start = max(lo, self.base)
+        end = min(hi, self.base + len(self.words) * 64)
+        if start < end:
+            w0 = (start - self.base) >> 6
+            w1 = (end - self.base + 63) >> 6
+            bits = np.unpackbits(self.words[w0:w1].view(np.uint8), bitorder='little')
+            off = self.base + w0 * 64
+            out[start - lo:end - lo] = bits[start - off:end - off]
+        return out
+
+    def words_in_range(self, base: int, nwords: int) -> np.ndarray:
+        """
+        Returns the nwords packed words covering ids [base, base + 64 * nwords). base must be 64-aligned.
+        """
+        out = np.zeros(nwords, dtype=_WORD)
+        off = (base - self.base) >> 6
+        lo = max(0, off)
+        hi = min(len(self.words), off + nwords)
+        if lo < hi:
+            out[lo - off:hi - off] = self.words[lo:hi]
+        return out
+
+    def __contains__(self, i) -> bool:
+        off = i - self.base
+        if off < 0 or (off >> 6) >= len(self.words):
+            return False
+        return bool((int(self.words[off >> 6]) >> (off & 63)) & 1)
+
+    def __len__(self) -> int:
+        if self._count is None:
+            self._count = int(np.unpackbits(self.words.view(np.uint8)).sum())
+        return self._count
+
+    def __bool__(self) -> bool:
+        # Emptiness doesn't need the full popcount behind __len__
+        if self._count is not None:
+            return self._count > 0
+        return bool(self.words.any())
+
+    def __iter__(self):
+        bits = np.unpackbits(self.words.view(np.uint8), bitorder='little')
+        return iter((np.flatnonzero(bits) + self.base).tolist())
+
+    def __sub__(self, other) -> Set[int]:
+        """
+        Ids I have that other doesn't (other: PeerBitmap, ChunkSet or any set of ids).
+        Bitmaps are combined word-wise as self & ~other.
+        """
+        if not len(self.words):
+            return set()
+        base = self.base
+        if isinstance(other, (PeerBitmap, ChunkSet)):
+            words = self.words & ~other.words_in_range(base, len(self.words))
+            bits = np.unpackbits(words.view(np.uint8), bitorder='little')
+        else:
+            bits = np.unpackbits(self.words.view(np.uint8), bitorder='little')
+            if other:
+                ids = np.fromiter(other, dtype=np.int64, count=len(other))
+                bits[ids[(ids >= base) & (ids < base + len(bits))] - base] = 0
+        return set((np.flatnonzero(bits) + base).tolist())
+
+    def __repr__(self):
+        return f"<PeerBitmap base={self.base} chunks={len(self)}>"
 
 class Peer:
     def __init__(self, host: str, port: int, role: str = "viewer"):
@@ -7,7 +126,7 @@ class Peer:
         self.port = port
         self.role = role
         self.last_seen = time.time()
-        self.remote_bitmap: Set[int] = set()
+        self.remote_bitmap = PeerBitmap()
         self.rtt = 0.0 # Round Trip Time in seconds
 
     def update_seen(self):
@@ -20,7 +139,9 @@ class Peer:
         else:
             self.rtt = 0.7 * self.rtt + 0.3 * rtt
 
-    def update_bitmap(self, bitmap_data: Set[int]):
+    def update_bitmap(self, bitmap_data):
+        if not isinstance(bitmap_data, PeerBitmap):
+            bitmap_data = PeerBitmap.from_ids(bitmap_data)
         self.remote_bitmap = bitmap_data
 
     def set_role(self, role: str):
@@ -30,8 +151,16 @@ class Peer:
         return f"<Peer {self.host}:{self.port} ({self.role})>"
 
 class PeerManager:
+    """
+    Peer table of one P2PNode. Only touched from the node's event loop (the rx workers are
+    asyncio tasks, the capture/GUI threads never reach it), so it takes no locks.
+    """
     def __init__(self):
         self.peers: Dict[tuple, Peer] = {} # (host, port) -> Peer
+        # Snapshot of the peer addresses, rebuilt lazily after a peer joins or is pruned
+        self._addrs: Optional[List[tuple]] = None
+        # Swarm-wide EWMA of RTT samples (seconds), 0.0 until the first PONG
+        self.avg_rtt = 0.0
 
     def update_peer(self, addr: tuple, role: str = None):
         """
@@ -42,12 +171,13 @@ class PeerManager:
         if addr not in self.peers:
             # Default role is viewer until told otherwise
             self.peers[addr] = Peer(host, port, role if role else "viewer")
+            self._addrs = None
         else:
             self.peers[addr].update_seen()
             if role:
                 self.peers[addr].set_role(role)
 
-    def update_bitmap(self, addr: tuple, bitmap_data: Set[int]):
+    def update_bitmap(self, addr: tuple, bitmap_data):
         """
         Updates the bitmap for the given peer address.
         """
@@ -60,12 +190,30 @@ class PeerManager:
             self.update_peer(addr)
             self.peers[addr].update_bitmap(bitmap_data)
 
+    def update_rtt(self, addr: tuple, rtt: float):
+        """
+        Records an RTT sample for a known peer and folds it into avg_rtt.
+        """
+        peer = self.peers.get(addr)
+        if peer is None:
+            return
+        peer.update_rtt(rtt)
+        self.avg_rtt = rtt if self.avg_rtt == 0.0 else 0.9 * self.avg_rtt + 0.1 * rtt
+
     def get_peer(self, addr: tuple) -> Peer:
         return self.peers.get(addr)
     
     def get_active_peers(self) -> Dict[tuple, Peer]:
         return self.peers
 
+    def get_peer_addrs(self) -> List[tuple]:
+        """
+        Returns the cached list of peer addresses (don't mutate it).
+        """
+        if self._addrs is None:
+            self._addrs = list(self.peers)
+        return self._addrs
+
     def prune_dead_peers(self, timeout: float = 5.0):
         """
         Removes peers that haven't been seen for 'timeout' seconds.
@@ -74,4 +222,6 @@ class PeerManager:
         dead_peers = [addr for addr, peer in self.peers.items() if now - peer.last_seen > timeout]
         for addr in dead_peers:
             del self.peers[addr]
+        if dead_peers:
+            self._addrs = None
         return dead_peers
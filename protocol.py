@@ -11,9 +11,12 @@ from dataclasses import dataclass
 # d = double (8 bytes)
 # H = unsigned short (2 bytes)
 HEADER_FORMAT = "!BBIdH"
-HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+_HEADER = struct.Struct(HEADER_FORMAT)
+HEADER_SIZE = _HEADER.size
+# Byte offset of the timestamp field, for patching prebuilt headers in place
+TIMESTAMP_OFFSET = struct.calcsize("!BBI")
 
-@dataclass
+@dataclass(slots=True)
 class Packet:
     ver: int
     msg_type: int
@@ -26,8 +29,7 @@ class Packet:
         Serializes the packet into bytes.
         """
         payload_len = len(self.payload)
-        header = struct.pack(
-            HEADER_FORMAT,
+        header = _HEADER.pack(
             self.ver,
             self.msg_type,
             self.seq,
@@ -40,18 +42,18 @@ class Packet:
     def unpack(cls, data: bytes) -> 'Packet':
         """
         Deserializes bytes into a Packet object.
+        The payload is a memoryview into data (no copy); use bytes(packet.payload) to keep it.
         Raises ValueError if data is too short or if payload length mismatch.
         """
         if len(data) < HEADER_SIZE:
             raise ValueError(f"Data too short for header. Expected at least {HEADER_SIZE}, got {len(data)}")
 
-        header_bytes = data[:HEADER_SIZE]
-        ver, msg_type, seq, timestamp, payload_len = struct.unpack(HEADER_FORMAT, header_bytes)
+        ver, msg_type, seq, timestamp, payload_len = _HEADER.unpack_from(data)
 
         if len(data) < HEADER_SIZE + payload_len:
             raise ValueError(f"Data too short for payload. Expected {HEADER_SIZE + payload_len}, got {len(data)}")
 
-        payload = data[HEADER_SIZE : HEADER_SIZE + payload_len]
+        payload = memoryview(data)[HEADER_SIZE : HEADER_SIZE + payload_len]
 
         return cls(
             ver=ver,
@@ -1,15 +1,85 @@
-import random
 from typing import Dict, Set, List, Tuple
 import logging
 
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+from peer_manager import PeerBitmap
+
 logger = logging.getLogger(__name__)
 
+# Probability of skipping a chunk this round when only broadcasters have it
+BROADCASTER_BACKOFF = 0.3
+# Chunks requested per round (raised from 20 to support ~20FPS video)
+BATCH_SIZE = 100
+
+_rng = np.random.default_rng()
+
+def _pick_targets_python(owners: np.ndarray, is_viewer: np.ndarray, backoff_p: float) -> np.ndarray:
+    """
+    owners: [n_chunks, n_peers] 0/1, is_viewer: [n_peers] bool.
+    Returns the chosen owner row per chunk, -1 where the chunk is skipped this round.
+    """
+    out = np.full(len(owners), -1, np.int64)
+    # All random draws for the round up front: one for the backoff, one for the owner pick
+    backoff_draws = _rng.random(len(owners)).tolist()
+    owner_draws = _rng.random(len(owners)).tolist()
+    for j, row in enumerate(owners):
+        rows = np.flatnonzero(row)
+        viewers = rows[is_viewer[rows]]
+        if len(viewers):
+            # Ideal case: Viewers have it. Always prefer them.
+            out[j] = viewers[int(owner_draws[j] * len(viewers))]
+        elif len(rows):
+            # Fallback case: Only Broadcaster has it.
+            
+            # SMART BACKOFF LOGIC:
+            # If we rely too much on Broadcaster, P2P ratio drops.
+            # But if we wait too long, video lags.
+            
+            # For now, let's use a simpler Probabilistic Backoff that is LESS AGGRESSIVE than before.
+            # 30% chance to wait (skip) if only broadcaster keeps it. 
+            # This encourages P2P propagation without stalling the stream too hard.
+            if backoff_draws[j] < backoff_p:
+                continue
+            out[j] = rows[int(owner_draws[j] * len(rows))]
+    return out
+
+if numba is not None:
+    @numba.njit(cache=True)
+    def _pick_targets(owners, is_viewer, backoff_p):
+        n_chunks, n_peers = owners.shape
+        out = np.full(n_chunks, -1, np.int64)
+        cand = np.empty(n_peers, np.int64)
+        for j in range(n_chunks):
+            n = 0
+            for r in range(n_peers):
+                if owners[j, r] and is_viewer[r]:
+                    cand[n] = r
+                    n += 1
+            if n == 0:
+                for r in range(n_peers):
+                    if owners[j, r]:
+                        cand[n] = r
+                        n += 1
+                if n == 0 or np.random.random() < backoff_p:
+                    continue
+            out[j] = cand[np.random.randint(n)]
+        return out
+else:
+    _pick_targets = _pick_targets_python
+
 class P2PScheduler:
     """
     Abstracts the logic of deciding which chunks to fetch and from whom.
     """
-    def __init__(self):
-        pass
+    def __init__(self, batch_size: int = BATCH_SIZE, broadcaster_backoff: float = BROADCASTER_BACKOFF):
+        self.batch_size = batch_size
+        self.broadcaster_backoff = broadcaster_backoff
 
     def schedule(self, 
                  my_bitmap: Set[int], 
@@ -27,84 +97,36 @@ class P2PScheduler:
         if not peers:
             return []
 
-        # 1. Identify all chunks available in the network that I don't have
-        available_unknown_chunks = set()
-        chunk_owners: Dict[int, List[tuple]] = {} # seq -> list of owner_addrs
-
+        # 1. Identify all chunks available in the network that I don't have:
+        #    stack the peers' packed bitmaps (rows) over a common word window and AND-NOT mine
+        addrs = []
+        bitmaps = []
         for addr, peer in peers.items():
-            remote_chunks = peer.remote_bitmap
-            new_chunks = remote_chunks - my_bitmap
-            available_unknown_chunks.update(new_chunks)
-            
-            for c in new_chunks:
-                if c not in chunk_owners:
-                    chunk_owners[c] = []
-                chunk_owners[c].append(addr)
-
-        if not available_unknown_chunks:
+            remote = peer.remote_bitmap
+            if not isinstance(remote, PeerBitmap):
+                remote = PeerBitmap.from_ids(remote)
+            if len(remote.words):
+                addrs.append(addr)
+                bitmaps.append(remote)
+        if not bitmaps:
             return []
 
+        base = min(b.base for b in bitmaps)
+        nwords = (max(b.base + len(b.words) * 64 for b in bitmaps) - base) // 64
+        mine = my_bitmap if hasattr(my_bitmap, "words_in_range") else PeerBitmap.from_ids(my_bitmap)
+        avail = np.stack([b.words_in_range(base, nwords) for b in bitmaps]) & ~mine.words_in_range(base, nwords)
+        avail_bits = np.unpackbits(avail.view(np.uint8), axis=1, bitorder='little')
+
         # 2. Strategy: Sequential (Oldest First) -> "True Urgency"
         # We prioritize what we need NEXT to play, rather than the newest data.
         # This naturally allows newer chunks to propagate in the P2P network while we catch up.
-        sorted_chunks = sorted(list(available_unknown_chunks), reverse=False)
-        
         # Rate Limit / Batch Size
-        batch_size = 100 # Increased from 20 to support ~20FPS video
-        chunks_to_process = sorted_chunks[:batch_size]
-        
-        requests = []
+        cols = np.flatnonzero(avail_bits.any(axis=0))[:self.batch_size]
+        if not len(cols):
+            return []
+        owners_by_col = np.ascontiguousarray(avail_bits[:, cols].T) # chunk -> owner rows (0/1)
+        is_viewer = np.array([getattr(peers[a], 'role', None) == "viewer" for a in addrs])
         
-        for chunk_id in chunks_to_process:
-            owners = chunk_owners[chunk_id]
-            
-            viewers = []
-            broadcasters = []
-            
-            for o_addr in owners:
-                # We need to access peer.role. 
-                # The 'peers' dict value is expected to have a 'role' attribute.
-                peer = peers.get(o_addr)
-                if peer and hasattr(peer, 'role') and peer.role == "viewer":
-                    viewers.append(o_addr)
-                else:
-                    broadcasters.append(o_addr)
-            
-            target_peer = None
-            
-            # 3. Strategy: P2P Optimization
-            if viewers:
-                # Ideal case: Viewers have it. Always prefer them.
-                target_peer = random.choice(viewers)
-                # logger.debug(f"Chunk {chunk_id}: Found {len(viewers)} viewers. Selected {target_peer}")
-            elif broadcasters:
-                # Fallback case: Only Broadcaster has it.
-                
-                # SMART BACKOFF LOGIC:
-                # If we rely too much on Broadcaster, P2P ratio drops.
-                # But if we wait too long, video lags.
-                
-                # Rule:
-                # 1. If I am the ONLY viewer (implied if I can't find other viewers for *any* chunk, but here purely local decision),
-                #    then I must download from Broadcaster.
-                # 2. If there are other viewers (but they just don't have this chunk YET),
-                #    we should wait a bit to see if they get it (P2P opportunity).
-                
-                # Heuristic: 
-                # If we are "caught up" (fetching recent chunks), we can afford to wait.
-                # If we are "lagging" (fetching old chunks), we must fetch ASAP.
-                
-                # For now, let's use a simpler Probabilistic Backoff that is LESS AGGRESSIVE than before.
-                # 30% chance to wait (skip) if only broadcaster keeps it. 
-                # This encourages P2P propagation without stalling the stream too hard.
-                if random.random() < 0.3:
-                     # logger.debug(f"Chunk {chunk_id}: Backoff from Broadcaster to wait for peers.")
-                     continue
-                
-                target_peer = random.choice(broadcasters)
-                # logger.debug(f"Chunk {chunk_id}: Fallback to Broadcaster {target_peer}")
-            
-            if target_peer:
-                requests.append((chunk_id, target_peer))
-                
-        return requests
+        # 3. Strategy: P2P Optimization (see _pick_targets_python)
+        targets = _pick_targets(owners_by_col, is_viewer, self.broadcaster_backoff)
+        return [(base + col, addrs[t]) for col, t in zip(cols.tolist(), targets.tolist()) if t >= 0]
@@ -1,4 +1,5 @@
 import time
+from collections import deque
 from typing import Dict, List, Any
 
 class StatsManager:
@@ -25,12 +26,14 @@ class StatsManager:
         self.current_download_rate = 0.0
 
         self.active_peers: List[tuple] = []
+        self._active_peers_fmt: List[str] = [] # "ip:port" of active_peers, rebuilt in update_peers
         self.buffer_health = 0
         self.my_bitmap_summary = ""
         
         # Source tracking for visualization
         self.download_by_source: Dict[str, int] = {} 
-        self.recent_downloads: List[tuple] = [] # (timestamp, bytes, source)
+        self.recent_downloads: deque = deque() # (monotonic timestamp, bytes, source), oldest first
+        self._recent_dist: Dict[str, int] = {} # source -> bytes in recent_downloads
         
         # Network Quality
         self.avg_rtt = 0.0
@@ -38,21 +41,29 @@ class StatsManager:
         # Global Stats Aggregation (for Broadcaster view)
         self.global_peer_stats: Dict[str, Any] = {} # "ip:port" -> stats_dict
 
+        # get_stats() result, updated in place on every call
+        self._stats_out: Dict[str, Any] = {}
+
 
     def add_upload(self, num_bytes: int):
         self.upload_bytes += num_bytes
 
     def add_download(self, num_bytes: int, source: str = "unknown"):
+        # Only called from the event loop thread, so plain (unsharded, unlocked) counters suffice
         self.download_bytes += num_bytes
-        if source not in self.download_by_source:
-            self.download_by_source[source] = 0
-        self.download_by_source[source] += num_bytes
+        by_source = self.download_by_source
+        by_source[source] = by_source.get(source, 0) + num_bytes
         
-        # Add to recent list
-        self.recent_downloads.append((time.time(), num_bytes, source))
+        # Add to recent window
+        self.recent_downloads.append((time.monotonic(), num_bytes, source))
+        recent = self._recent_dist
+        recent[source] = recent.get(source, 0) + num_bytes
 
     def update_peers(self, peers: List[tuple]):
+        if peers is self.active_peers:
+            return
         self.active_peers = peers
+        self._active_peers_fmt = [f"{p[0]}:{p[1]}" for p in peers]
         
     def update_network_quality(self, avg_rtt: float):
         self.avg_rtt = avg_rtt
@@ -87,28 +98,32 @@ class StatsManager:
             self.last_calc_time = now
 
         # Calculate Recent Distribution (Last 10s)
-        cutoff = now - 10.0
-        # Prune old records (keep list small)
-        self.recent_downloads = [x for x in self.recent_downloads if x[0] > cutoff]
-        
-        recent_dist = {}
-        for _, b, src in self.recent_downloads:
-            recent_dist[src] = recent_dist.get(src, 0) + b
-
-        return {
-            "role": self.role,
-            "uptime": int(now - self.start_time),
-
-            "upload_rate": self.current_upload_rate,
-            "download_rate": self.current_download_rate,
-            "total_upload": self.upload_bytes,
-            "total_download": self.download_bytes,
-            "active_peers": [f"{p[0]}:{p[1]}" for p in self.active_peers],
-            "peer_count": len(self.active_peers),
-            "buffer_health": self.buffer_health,
-            "bitmap": self.my_bitmap_summary,
-            "source_distribution": self.download_by_source,
-            "source_distribution_10s": recent_dist,
-            "avg_rtt": round(self.avg_rtt, 1),
-            "global_stats": self.global_peer_stats
-        }
+        # Expire records from the front; the per-source sums are kept incrementally
+        cutoff = time.monotonic() - 10.0
+        rd, recent = self.recent_downloads, self._recent_dist
+        while rd and rd[0][0] <= cutoff:
+            _, b, src = rd.popleft()
+            left = recent[src] - b
+            if left:
+                recent[src] = left
+            else:
+                del recent[src]
+        recent_dist = dict(recent)
+
+        # One dict reused across polls (callers that keep a snapshot copy it, see dashboard.py)
+        out = self._stats_out
+        out["role"] = self.role
+        out["uptime"] = int(now - self.start_time)
+        out["upload_rate"] = self.current_upload_rate
+        out["download_rate"] = self.current_download_rate
+        out["total_upload"] = self.upload_bytes
+        out["total_download"] = self.download_bytes
+        out["active_peers"] = self._active_peers_fmt
+        out["peer_count"] = len(self.active_peers)
+        out["buffer_health"] = self.buffer_health
+        out["bitmap"] = self.my_bitmap_summary
+        out["source_distribution"] = self.download_by_source
+        out["source_distribution_10s"] = recent_dist
+        out["avg_rtt"] = round(self.avg_rtt, 1)
+        out["global_stats"] = self.global_peer_stats
+        return out
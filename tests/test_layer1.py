@@ -34,23 +34,20 @@ def receiver_callback(packet: Packet, addr: tuple):
         logger.warning(f"Simulating PACKET LOSS for seq {packet.seq}")
         return
 
-    # Simulate Network Delay
-    async def process_delayed():
-        delay = random.uniform(0, MAX_DELAY)
-        await asyncio.sleep(delay)
-        
-        logger.info(f"Received Packet: seq={packet.seq}, type={packet.msg_type}, len={len(packet.payload)}")
-        received_packets.add(packet.seq)
-        
-        # Check if we should stop (relaxed condition due to loss)
-        # In a real scenario we'd use timeouts, but here we just check if we got enough or last one
-        if len(received_packets) >= TOTAL_PACKETS * (1 - LOSS_RATE): 
-             # Just a heuristic to trigger event, but better to wait for a timeout in main
-             pass
-        if packet.seq == TOTAL_PACKETS:
-             pass
-
-    asyncio.create_task(process_delayed())
+    # Simulate Network Delay (a timer callback, not a Task per packet)
+    asyncio.get_running_loop().call_later(random.uniform(0, MAX_DELAY), process_delayed, packet)
+
+def process_delayed(packet: Packet):
+    logger.info(f"Received Packet: seq={packet.seq}, type={packet.msg_type}, len={len(packet.payload)}")
+    received_packets.add(packet.seq)
+    
+    # Check if we should stop (relaxed condition due to loss)
+    # In a real scenario we'd use timeouts, but here we just check if we got enough or last one
+    if len(received_packets) >= TOTAL_PACKETS * (1 - LOSS_RATE): 
+         # Just a heuristic to trigger event, but better to wait for a timeout in main
+         pass
+    if packet.seq == TOTAL_PACKETS:
+         pass
 
 async def run_test():
     # 1. Start Receiver
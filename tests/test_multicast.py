@@ -0,0 +1,78 @@
+import asyncio
+import logging
+import sys
+import os
+
+# Ensure parent directory is in path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from p2p_node import P2PNode
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(message)s')
+logger = logging.getLogger("TestMulticast")
+
+HOST = "127.0.0.1"
+PORT_A = 10011
+PORT_B = 10012
+GROUP = ("239.255.42.1", 10019)
+
+async def run_multicast():
+    # Two nodes bound like main.py and connected over loopback: the group packets' source is
+    # the LAN interface IP, not the 127.0.0.1 address the peers know each other by
+    node_a = P2PNode("0.0.0.0", PORT_A, initial_chunks={1, 2, 3}, multicast=GROUP)
+    node_b = P2PNode("0.0.0.0", PORT_B, initial_chunks=set(), multicast=GROUP)
+    await node_a.start()
+    await node_b.start()
+    try:
+        assert node_a.multicast and node_b.multicast, "Multicast group unavailable"
+        node_b.connect_to(HOST, PORT_A)
+        await asyncio.sleep(2.5)
+
+        # Each node heard the other's BITMAP/HEARTBEAT on the group, under the known peer address
+        assert (HOST, PORT_A) in node_b._mcast_confirmed, "B never matched A's group packets"
+        assert (HOST, PORT_B) in node_a._mcast_confirmed, "A never matched B's group packets"
+        # ... without adding the interface address as a second peer
+        assert set(node_b.peer_manager.peers) == {(HOST, PORT_A)}, f"Unexpected peers: {list(node_b.peer_manager.peers)}"
+        assert set(node_a.peer_manager.peers) == {(HOST, PORT_B)}, f"Unexpected peers: {list(node_a.peer_manager.peers)}"
+        remote = node_b.peer_manager.peers[(HOST, PORT_A)].remote_bitmap
+        assert all(seq in remote for seq in (1, 2, 3)), "B has no bitmap from A"
+    finally:
+        await node_a.stop()
+        await node_b.stop()
+
+    logger.info("Multicast Test PASSED!")
+
+async def run_unicast_fallback():
+    # Bound to 127.0.0.1 the group packets never leave the host: peers are never
+    # confirmed on the group and must keep getting BITMAP/HEARTBEAT by unicast
+    node_a = P2PNode(HOST, PORT_A, initial_chunks={1, 2, 3}, multicast=GROUP)
+    node_b = P2PNode(HOST, PORT_B, initial_chunks=set(), multicast=GROUP)
+    await node_a.start()
+    await node_b.start()
+    try:
+        node_b.connect_to(HOST, PORT_A)
+        await asyncio.sleep(2.5)
+
+        assert (HOST, PORT_A) not in node_b._mcast_confirmed, "A confirmed without reaching the group"
+        remote = node_b.peer_manager.peers[(HOST, PORT_A)].remote_bitmap
+        assert all(seq in remote for seq in (1, 2, 3)), "B has no bitmap from A"
+    finally:
+        await node_a.stop()
+        await node_b.stop()
+
+    logger.info("Unicast Fallback Test PASSED!")
+
+def test_multicast_loopback():
+    asyncio.run(run_multicast())
+
+def test_multicast_unicast_fallback():
+    asyncio.run(run_unicast_fallback())
+
+if __name__ == "__main__":
+    try:
+        test_multicast_loopback()
+        test_multicast_unicast_fallback()
+    except Exception as e:
+        logger.error(f"Test Failed: {e}")
+        exit(1)
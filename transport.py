@@ -1,10 +1,32 @@
 import asyncio
+import functools
 import logging
-from typing import Callable, Optional
-from protocol import Packet
+import socket
+import struct
+from typing import Callable, Dict, List, Optional
+from protocol import Packet, HEADER_SIZE
+
+try:
+    from stats_manager import StatsManager
+except ImportError:
+    StatsManager = None
 
 logger = logging.getLogger(__name__)
 
+# Socket buffer sizes: OS defaults (~200KB on many systems) drop packets when a JPEG frame's
+# fragments arrive in a burst. The kernel may clamp these (e.g. net.core.rmem_max on Linux).
+RCVBUF_SIZE = 4 * 1024 * 1024
+SNDBUF_SIZE = 1 * 1024 * 1024
+# Max datagrams handled per socket readiness event (see _Protocol.datagram_received)
+RECV_BATCH = 64
+
+@functools.lru_cache(maxsize=4096)
+def addr_key(addr: tuple) -> str:
+    """
+    "ip:port" stats key for an address, cached (the same few peers send every packet).
+    """
+    return f"{addr[0]}:{addr[1]}"
+
 class UDPTransport:
     def __init__(self, on_packet_received: Optional[Callable[[Packet, tuple], None]] = None):
         """
@@ -12,28 +34,57 @@ class UDPTransport:
         """
         self.transport = None
         self.protocol = None
+        self.sock: Optional[socket.socket] = None
         self.on_packet_received = on_packet_received
+        # msg_type -> callback(raw datagram, addr), called instead of unpacking into a Packet
+        self.raw_handlers: Dict[int, Callable[[bytes, tuple], None]] = {}
+        # Optional LAN multicast receive side, see join_multicast
+        self.mcast_transport = None
+        self.on_multicast_received: Optional[Callable[[Packet, tuple], None]] = None
+        self._stats = StatsManager() if StatsManager else None
 
     class _Protocol(asyncio.DatagramProtocol):
-        def __init__(self, outer):
+        def __init__(self, outer, sock: socket.socket, multicast: bool = False):
             self.outer = outer
+            self.sock = sock
+            self.multicast = multicast
 
         def connection_made(self, transport):
-            self.outer.transport = transport
+            if not self.multicast:
+                self.outer.transport = transport
             logger.info("UDP Transport connection made")
 
         def datagram_received(self, data, addr):
+            self._handle(data, addr)
+            
+            # asyncio reads one datagram per readiness event; drain whatever else the
+            # kernel already queued so a burst costs one selector round trip, not one each
+            sock = self.sock
+            for _ in range(RECV_BATCH - 1):
+                try:
+                    data, addr = sock.recvfrom(65536)
+                except (BlockingIOError, InterruptedError):
+                    return
+                except OSError as e:
+                    self.error_received(e)
+                    return
+                self._handle(data, addr)
+
+        def _handle(self, data, addr):
             # Stats integration
-            try:
-                from stats_manager import StatsManager
-                StatsManager().add_download(len(data), f"{addr[0]}:{addr[1]}")
-            except ImportError:
-                pass
+            stats = self.outer._stats
+            if stats is not None:
+                stats.add_download(len(data), addr_key(addr))
             
             try:
-                packet = Packet.unpack(data)
-                if self.outer.on_packet_received:
-                    self.outer.on_packet_received(packet, addr)
+                if not self.multicast and len(data) >= HEADER_SIZE:
+                    raw_handler = self.outer.raw_handlers.get(data[1])
+                    if raw_handler:
+                        raw_handler(data, addr)
+                        return
+                callback = self.outer.on_multicast_received if self.multicast else self.outer.on_packet_received
+                if callback:
+                    callback(Packet.unpack(data), addr)
             except Exception as e:
                 logger.error(f"Error unpacking packet from {addr}: {e}")
 
@@ -48,15 +99,58 @@ class UDPTransport:
         Binds the UDP socket to the given host and port.
         """
         loop = asyncio.get_running_loop()
-        # Create the datagram endpoint
-        transport, protocol = await loop.create_datagram_endpoint(
-            lambda: self._Protocol(self),
-            local_addr=(host, port)
-        )
+        # Own the socket so datagram_received can drain it directly
+        family, _, _, _, sockaddr = socket.getaddrinfo(host, port, type=socket.SOCK_DGRAM)[0]
+        sock = socket.socket(family, socket.SOCK_DGRAM)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RCVBUF_SIZE)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SNDBUF_SIZE)
+        except OSError as e:
+            logger.warning(f"Could not set UDP socket buffer sizes: {e}")
+        try:
+            sock.bind(sockaddr)
+            sock.setblocking(False)
+            # Create the datagram endpoint
+            transport, protocol = await loop.create_datagram_endpoint(
+                lambda: self._Protocol(self, sock),
+                sock=sock
+            )
+        except BaseException:
+            sock.close()
+            raise
         self.transport = transport
         self.protocol = protocol
+        self.sock = sock
+
         logger.info(f"UDP Server started on {host}:{port}")
 
+    async def join_multicast(self, group: str, port: int, on_packet: Callable[[Packet, tuple], None]):
+        """
+        Also receives datagrams sent to the IPv4 multicast group:port and hands them to on_packet.
+        Several processes on one host can join the same group (SO_REUSEADDR/SO_REUSEPORT).
+        Sending to the group goes through the normal socket, so the source address stays the node's.
+        """
+        loop = asyncio.get_running_loop()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if hasattr(socket, "SO_REUSEPORT"):
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            sock.bind(("", port))
+            mreq = struct.pack("4s4s", socket.inet_aton(group), socket.inet_aton("0.0.0.0"))
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+            sock.setblocking(False)
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda: self._Protocol(self, sock, multicast=True),
+                sock=sock
+            )
+        except BaseException:
+            sock.close()
+            raise
+        self.on_multicast_received = on_packet
+        self.mcast_transport = transport
+        logger.info(f"Joined multicast group {group}:{port}")
+
     def send_packet(self, packet: Packet, addr: tuple):
         """
         Serializes and sends a packet to the specified address.
@@ -69,18 +163,69 @@ class UDPTransport:
             data = packet.pack()
             self.transport.sendto(data, addr)
             # Stats integration
-            try:
-                from stats_manager import StatsManager
-                StatsManager().add_upload(len(data))
-            except ImportError:
-                pass
+            if self._stats is not None:
+                self._stats.add_upload(len(data))
         except Exception as e:
             logger.error(f"Failed to send packet to {addr}: {e}")
 
+    def send_raw(self, data: bytes, addr: tuple):
+        """
+        Sends an already serialized packet (skips Packet construction and packing).
+        """
+        if self.transport is None:
+            logger.warning("Transport is not open. Cannot send packet.")
+            return
+        
+        try:
+            self.transport.sendto(data, addr)
+            # Stats integration
+            if self._stats is not None:
+                self._stats.add_upload(len(data))
+        except Exception as e:
+            logger.error(f"Failed to send packet to {addr}: {e}")
+
+    def send_many(self, packets_by_addr: Dict[tuple, List[bytes]]) -> int:
+        """
+        Sends already serialized packets, grouped by destination, in one pass.
+        Returns the number of bytes handed to the socket.
+        """
+        if self.transport is None:
+            logger.warning("Transport is not open. Cannot send packets.")
+            return 0
+
+        # While the transport has nothing buffered, write straight to the socket (skips the
+        # transport's per-call checks); once the socket would block, let the transport queue the rest
+        sendto = self.transport.sendto
+        direct = self.sock is not None and self.transport.get_write_buffer_size() == 0
+        total = 0
+        for addr, datagrams in packets_by_addr.items():
+            try:
+                for data in datagrams:
+                    if direct:
+                        try:
+                            self.sock.sendto(data, addr)
+                        except (BlockingIOError, InterruptedError):
+                            direct = False
+                            sendto(data, addr)
+                    else:
+                        sendto(data, addr)
+                    total += len(data)
+            except Exception as e:
+                logger.error(f"Failed to send packets to {addr}: {e}")
+        
+        # Stats integration (once per batch)
+        if self._stats is not None:
+            self._stats.add_upload(total)
+        return total
+
     def close(self):
         """
         Closes the transport.
         """
+        if self.mcast_transport:
+            self.mcast_transport.close()
+            self.mcast_transport = None
         if self.transport:
             self.transport.close()
+            self.sock = None
             logger.info("UDP Transport closed")
@@ -1,17 +1,42 @@
 import cv2
 import numpy as np
 import logging
+from dataclasses import dataclass
 from typing import Dict, Optional, List
-from video_protocol import ChunkPayload
+from video_protocol import ChunkPayload, FRAG_DATA_SIZE, FRAME_ID_STRUCT
+
+try:
+    from stats_manager import StatsManager
+except ImportError:
+    StatsManager = None
 
 logger = logging.getLogger(__name__)
 
+# Recycled frame buffers (see FrameReassembler._cleanup); a buffer may be longer than the frame using it
+_FRAME_POOL: List[bytearray] = []
+FRAME_POOL_SIZE = 8
+
+def _frame_buffer(size: int) -> bytearray:
+    if _FRAME_POOL and len(_FRAME_POOL[-1]) >= size:
+        return _FRAME_POOL.pop()
+    return bytearray(size)
+
+@dataclass(slots=True)
+class _PartialFrame:
+    """
+    One frame being reassembled: fragments are written straight into buf at frag_index * FRAG_DATA_SIZE.
+    """
+    buf: bytearray
+    got: bytearray # 1 per fragment received (duplicates are ignored)
+    count: int = 0
+    length: int = 0 # final frame length, known once the last fragment arrives
+
 class FrameReassembler:
     def __init__(self):
-        # frame_id -> {frag_index: data_bytes}
-        self.buffers: Dict[int, Dict[int, bytes]] = {}
-        # frame_id -> total_frags (to know when complete)
-        self.meta: Dict[int, int] = {}
+        # frame_id -> partially received frame
+        self.buffers: Dict[int, _PartialFrame] = {}
+        self._stats = StatsManager() if StatsManager else None
+        self._reported_health = -1
         
         self.last_completed_frame_id = -1
 
@@ -22,43 +47,55 @@ class FrameReassembler:
         Otherwise returns None.
         """
         try:
-            chunk = ChunkPayload.unpack(payload_bytes)
-            
-            # Discard old frames immediately to save memory
-            if chunk.frame_id <= self.last_completed_frame_id:
+            # Discard old frames immediately to save memory (peek at frame_id before a full unpack)
+            if FRAME_ID_STRUCT.unpack_from(payload_bytes)[0] <= self.last_completed_frame_id:
                 return None
             
-            if chunk.frame_id not in self.buffers:
-                self.buffers[chunk.frame_id] = {}
-                self.meta[chunk.frame_id] = chunk.total_frags
+            chunk = ChunkPayload.unpack(payload_bytes)
             
-            self.buffers[chunk.frame_id][chunk.frag_index] = chunk.data
+            total_frags, idx = chunk.total_frags, chunk.frag_index
+            frame = self.buffers.get(chunk.frame_id)
+            if frame is None:
+                frame = self.buffers[chunk.frame_id] = _PartialFrame(
+                    _frame_buffer(total_frags * FRAG_DATA_SIZE), bytearray(total_frags))
+            
+            if idx >= len(frame.got):
+                raise ValueError(f"Fragment {idx} out of range for frame {chunk.frame_id}")
+            if frame.got[idx]:
+                # Duplicate: already written, and it can't complete the frame
+                return None
+            data = chunk.data
+            size = len(data)
+            is_last = idx == len(frame.got) - 1
+            # Slice assignment of a different length would resize the buffer
+            if size > FRAG_DATA_SIZE or (size != FRAG_DATA_SIZE and not is_last):
+                raise ValueError(f"Bad fragment size {size} for frame {chunk.frame_id}")
+            off = idx * FRAG_DATA_SIZE
+            frame.buf[off:off + size] = data
+            frame.got[idx] = 1
+            frame.count += 1
+            if is_last:
+                frame.length = off + size
             
             # Stats Integration: Buffer Health = number of partially or fully buffered frames
-            try:
-                from stats_manager import StatsManager
-                # Count frames that are complete in buffer (waiting to be returned by caller, 
-                # though here we return immediately, so this metric is transient. 
-                # Better metric: Queue size in main loop. But let's track 'partial frames' for now)
-                StatsManager().update_buffer_health(len(self.buffers))
-            except ImportError:
-                pass
+            # (Count frames that are complete in buffer (waiting to be returned by caller, 
+            # though here we return immediately, so this metric is transient. 
+            # Better metric: Queue size in main loop. But let's track 'partial frames' for now)
+            health = len(self.buffers)
+            if health != self._reported_health and self._stats is not None:
+                self._stats.update_buffer_health(health)
+                self._reported_health = health
 
             # Check for completion
-            current_buffer = self.buffers[chunk.frame_id]
-            total_frags = self.meta[chunk.frame_id]
-            
-            if len(current_buffer) == total_frags:
-                # Reassemble
-                full_data = bytearray()
-                for i in range(total_frags):
-                    full_data.extend(current_buffer[i])
+            if frame.count == len(frame.got):
+                with memoryview(frame.buf) as view:
+                    full_data = bytes(view[:frame.length])
                 
                 # Cleanup this frame and older partial frames
                 self._cleanup(chunk.frame_id)
                 self.last_completed_frame_id = chunk.frame_id
                 
-                return bytes(full_data)
+                return full_data
                 
             return None
             
@@ -72,47 +109,152 @@ class FrameReassembler:
         """
         to_del = [fid for fid in self.buffers if fid <= completed_id]
         for fid in to_del:
-            del self.buffers[fid]
-            del self.meta[fid]
+            frame = self.buffers.pop(fid)
+            if len(_FRAME_POOL) < FRAME_POOL_SIZE:
+                _FRAME_POOL.append(frame.buf)
 
+import asyncio
+import queue
+import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Optional: libjpeg-turbo through PyTurboJPEG decodes faster than cv2.imdecode; needs the shared library too
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR
+    _tj = TurboJPEG()
+except (ImportError, RuntimeError, OSError):
+    _tj = None
+
+def _decode(jpeg_data: bytes):
+    if _tj is not None:
+        return _tj.decode(jpeg_data, pixel_format=TJPF_BGR)
+    return cv2.imdecode(np.frombuffer(jpeg_data, np.uint8), cv2.IMREAD_COLOR)
+
+class GuiThread(threading.Thread):
+    """
+    Owns all cv2 window calls (imshow/waitKey/destroyAllWindows) so they never block the asyncio loop.
+    Frames are handed over through a single slot: a newer frame replaces one not yet shown,
+    so the window always shows the latest frame rather than working through a backlog.
+    """
+    def __init__(self, show):
+        super().__init__(name="gui", daemon=True)
+        self.q = queue.Queue(maxsize=1)
+        self._show = show
+        self._stop_event = threading.Event()
+
+    def put(self, jpeg_data: bytes):
+        try:
+            self.q.put_nowait(jpeg_data)
+        except queue.Full:
+            try:
+                self.q.get_nowait()
+            except queue.Empty:
+                pass
+            self.q.put_nowait(jpeg_data)
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                jpeg_data = self.q.get(timeout=0.05)
+            except queue.Empty:
+                # Keep the window responsive when no frames arrive
+                cv2.waitKey(1)
+                continue
+            self._show(jpeg_data)
+        cv2.destroyAllWindows()
+
+    def stop(self):
+        self._stop_event.set()
 
 class VideoRenderer:
-    def __init__(self, window_name="P2P Stream"):
+    def __init__(self, window_name="P2P Stream", threaded: Optional[bool] = None):
+        """
+        :param threaded: run the cv2 GUI on its own thread. Defaults to True except on macOS,
+                         where cv2 windows must be driven from the main thread.
+        """
         self.window_name = window_name
         
         # OSD Stats
         self.fps_counter = 0
         self.bytes_counter = 0
-        self.last_update_time = time.time()
+        self.last_update_time = time.monotonic()
         self.display_text_fps = "FPS: 0"
         self.display_text_kbps = "Rate: 0 KB/s"
         self.display_text_res = "Res: -"
 
+        if threaded is None:
+            threaded = sys.platform != "darwin"
+        self.gui = GuiThread(self._show) if threaded else None
+        if self.gui:
+            self.gui.start()
+        # Without a GUI thread, render_async decodes here so the event loop isn't blocked
+        self._decoder = None if self.gui else ThreadPoolExecutor(max_workers=1, thread_name_prefix="decode")
+
     def render(self, jpeg_data: bytes):
         """
-        Decodes and shows the image.
+        Hands the frame to the GUI thread, or decodes and shows it inline when not threaded.
         """
         if not jpeg_data:
             return
-            
+        if self.gui:
+            self.gui.put(jpeg_data)
+        else:
+            self._show(jpeg_data)
+
+    async def render_async(self, jpeg_data: bytes):
+        """
+        Same as render, but when not threaded the JPEG decode runs on a worker thread and only
+        imshow/waitKey stay on the calling (main) thread.
+        """
+        if not jpeg_data:
+            return
+        if self.gui:
+            self.gui.put(jpeg_data)
+            return
+        t0 = time.monotonic()
+        try:
+            img = await asyncio.get_running_loop().run_in_executor(self._decoder, _decode, jpeg_data)
+        except Exception as e:
+            logger.error(f"Render error: {e}")
+            return
+        self._display(img, len(jpeg_data), t0)
+
+    def close(self):
+        if self.gui:
+            self.gui.stop()
+        if self._decoder:
+            self._decoder.shutdown(wait=False)
+
+    def _show(self, jpeg_data: bytes):
+        """
+        Decodes and shows the image.
+        """
+        t0 = time.monotonic()
+        try:
+            img = _decode(jpeg_data)
+        except Exception as e:
+            logger.error(f"Render error: {e}")
+            return
+        self._display(img, len(jpeg_data), t0)
+
+    def _display(self, img, nbytes: int, t0: float):
+        """
+        Draws the OSD on a decoded frame and shows it.
+        """
         try:
-            # Bytes -> Numpy
-            t0 = time.time()
-            np_arr = np.frombuffer(jpeg_data, np.uint8)
-            # Decode
-            img = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-            
             if img is None:
                 logger.error("Failed to decode JPEG frame")
                 return
 
-            dt_decode = (time.time() - t0) * 1000
+            # One clock read serves both the decode timing and the OSD stats
+            now = time.monotonic()
+            dt_decode = (now - t0) * 1000
 
             # Update Stats
             self.fps_counter += 1
-            self.bytes_counter += len(jpeg_data)
-            now = time.time()
+            self.bytes_counter += nbytes
             elapsed = now - self.last_update_time
             if elapsed >= 1.0:
                 fps = self.fps_counter / elapsed
@@ -150,7 +292,7 @@ class VideoRenderer:
             cv2.imshow(self.window_name, img)
             cv2.waitKey(1) # 1ms delay to process events
             
-            dt_total = (time.time() - t0) * 1000
+            dt_total = (time.monotonic() - t0) * 1000
             if dt_total > 30:
                 logger.warning(f"Slow Render: {dt_total:.1f}ms (Decode: {dt_decode:.1f}ms)")
             
@@ -6,9 +6,16 @@ from dataclasses import dataclass
 # total_frags (2 bytes, unsigned short)
 # frag_index (2 bytes, unsigned short)
 PAYLOAD_HEADER_FORMAT = "!IHH"
-PAYLOAD_HEADER_SIZE = struct.calcsize(PAYLOAD_HEADER_FORMAT)
+_PAYLOAD_HEADER = struct.Struct(PAYLOAD_HEADER_FORMAT)
+PAYLOAD_HEADER_SIZE = _PAYLOAD_HEADER.size
+# Just the leading frame_id, for peeking at a payload without a full unpack
+FRAME_ID_STRUCT = struct.Struct("!I")
+# Just the trailing frag_index, for stamping a header packed once per frame (see FrameFragmenter)
+FRAG_INDEX_STRUCT = struct.Struct("!H")
+# Video bytes per fragment; every fragment but a frame's last carries exactly this many
+FRAG_DATA_SIZE = 1000
 
-@dataclass
+@dataclass(slots=True)
 class ChunkPayload:
     frame_id: int
     total_frags: int
@@ -19,8 +26,7 @@ class ChunkPayload:
         """
         Serializes the chunk payload info + actual video data.
         """
-        header = struct.pack(
-            PAYLOAD_HEADER_FORMAT,
+        header = _PAYLOAD_HEADER.pack(
             self.frame_id,
             self.total_frags,
             self.frag_index
@@ -31,14 +37,12 @@ class ChunkPayload:
     def unpack(cls, buffer: bytes) -> 'ChunkPayload':
         """
         Deserializes bytes into ChunkPayload.
+        data is a memoryview into buffer (no copy); use bytes(chunk.data) to keep it.
         """
         if len(buffer) < PAYLOAD_HEADER_SIZE:
             raise ValueError(f"Buffer too short for video payload header. Got {len(buffer)}")
             
-        frame_id, total_frags, frag_index = struct.unpack(
-            PAYLOAD_HEADER_FORMAT, 
-            buffer[:PAYLOAD_HEADER_SIZE]
-        )
-        data = buffer[PAYLOAD_HEADER_SIZE:]
+        frame_id, total_frags, frag_index = _PAYLOAD_HEADER.unpack_from(buffer)
+        data = memoryview(buffer)[PAYLOAD_HEADER_SIZE:]
         
         return cls(frame_id, total_frags, frag_index, data)
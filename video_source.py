@@ -4,10 +4,18 @@ import numpy as np
 import mss
 import logging
 from typing import List, Tuple
-from video_protocol import ChunkPayload
+from video_protocol import ChunkPayload, FRAG_DATA_SIZE, FRAG_INDEX_STRUCT
+from chunk_store import FRAGS_PER_FRAME
 
 logger = logging.getLogger(__name__)
 
+# Optional: libjpeg-turbo through PyTurboJPEG encodes faster than cv2.imencode; needs the shared library too
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGRA, TJSAMP_420
+    _tj = TurboJPEG()
+except (ImportError, RuntimeError, OSError):
+    _tj = None
+
 class ScreenCapturer:
     def __init__(self, monitor_idx=1, width=640, height=480):
         self.sct = mss.mss()
@@ -19,6 +27,15 @@ class ScreenCapturer:
         
         # Optionally resize capture to target resolution to save bandwidth
         self.target_res = (width, height)
+
+        # Reused output buffers, both at the target size: the resized BGRA frame and its BGR copy
+        self._small = np.empty((height, width, 4), dtype=np.uint8)
+        self._buf = np.empty((height, width, 3), dtype=np.uint8)
+        # cv2.imencode params: quality 50, baseline and non-optimized Huffman (the fastest path)
+        self._enc_params = [cv2.IMWRITE_JPEG_QUALITY, 50, cv2.IMWRITE_JPEG_OPTIMIZE, 0, cv2.IMWRITE_JPEG_PROGRESSIVE, 0]
+        # Pin 4:2:0 chroma subsampling, like the libjpeg-turbo path (the flag needs OpenCV >= 4.5.5)
+        if hasattr(cv2, "IMWRITE_JPEG_SAMPLING_FACTOR"):
+            self._enc_params += [cv2.IMWRITE_JPEG_SAMPLING_FACTOR, cv2.IMWRITE_JPEG_SAMPLING_FACTOR_420]
     
     def capture_frame(self) -> bytes:
         """
@@ -26,28 +43,32 @@ class ScreenCapturer:
         """
         try:
             # Capture
-            t0 = time.time()
+            t0 = time.monotonic()
             sct_img = self.sct.grab(self.monitor)
-            # Convert to numpy array (BGRA)
-            frame = np.array(sct_img)
-            # Drop Alpha channel (BGRA -> BGR)
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR)
+            # View as numpy array (BGRA) without copying the raw buffer
+            frame = np.asarray(sct_img)
             
-            # Resize
-            frame = cv2.resize(frame, self.target_res)
+            # Resize first, so the only full-resolution pass is the resize itself
+            frame = cv2.resize(frame, self.target_res, dst=self._small)
             
             # Compress to JPG
             # Quality 50 is a good tradeoff for speed/size
-            retval, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), 50])
+            if _tj is not None:
+                # libjpeg-turbo takes BGRA as is
+                jpeg = _tj.encode(frame, quality=50, pixel_format=TJPF_BGRA, jpeg_subsample=TJSAMP_420)
+            else:
+                # Drop Alpha channel (BGRA -> BGR)
+                frame = cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR, dst=self._buf)
+                retval, buffer = cv2.imencode('.jpg', frame, self._enc_params)
+                if not retval:
+                    raise RuntimeError("Failed to encode frame to JPEG")
+                jpeg = buffer.tobytes()
             
-            dt = (time.time() - t0) * 1000
+            dt = (time.monotonic() - t0) * 1000
             if dt > 30:
                 logger.warning(f"Slow Capture+Encode: {dt:.1f}ms")
-            
-            if not retval:
-                raise RuntimeError("Failed to encode frame to JPEG")
                 
-            return buffer.tobytes()
+            return jpeg
         except Exception as e:
             logger.error(f"Screen capture failed: {e}")
             return None
@@ -55,39 +76,38 @@ class ScreenCapturer:
 class FrameFragmenter:
     # Target payload size for UDP (accounting for IP/UDP headers + Layer 1 header + Layer 3 header)
     # MTU ~1500. Safe payload ~1000.
-    MAX_PAYLOAD_SIZE = 1000
+    MAX_PAYLOAD_SIZE = FRAG_DATA_SIZE
 
     @staticmethod
     def fragment(frame_id: int, frame_data: bytes) -> List[Tuple[int, bytes]]:
         """
         Splits a frame into chunks.
         Returns a list of (chunk_id, packed_video_payload).
-        chunk_id = frame_id * 1000 + frag_index
+        chunk_id = frame_id * FRAGS_PER_FRAME + frag_index
         """
         total_len = len(frame_data)
         num_frags = (total_len + FrameFragmenter.MAX_PAYLOAD_SIZE - 1) // FrameFragmenter.MAX_PAYLOAD_SIZE
         
+        # Generate Chunk IDs for Layer 2
+        # Prerequisite: num_frags < FRAGS_PER_FRAME for this simple ID scheme
+        if num_frags >= FRAGS_PER_FRAME:
+            logger.warning("Frame too large! Fragment index overlap risk.")
+        base_id = frame_id * FRAGS_PER_FRAME
+        
+        # Layer 3 header: frame_id and total_frags are the same for every fragment, so pack
+        # them once (as ChunkPayload.pack would) and only append each frag_index
+        prefix = ChunkPayload(frame_id, num_frags, 0, b"").pack()[:-FRAG_INDEX_STRUCT.size]
+        pack_index = FRAG_INDEX_STRUCT.pack
+        
+        # Slice fragments out of a view: the concatenation below is their only copy
+        view = memoryview(frame_data)
         result = []
         for i in range(num_frags):
             start = i * FrameFragmenter.MAX_PAYLOAD_SIZE
             end = min(start + FrameFragmenter.MAX_PAYLOAD_SIZE, total_len)
-            chunk_data = frame_data[start:end]
-            
-            # Create Layer 3 Payload
-            payload_obj = ChunkPayload(
-                frame_id=frame_id,
-                total_frags=num_frags,
-                frag_index=i,
-                data=chunk_data
-            )
-            packed_payload = payload_obj.pack()
+            chunk_data = view[start:end]
             
-            # Generate Chunk ID for Layer 2
-            # Prerequisite: num_frags < 1000 for this simple ID scheme
-            if num_frags >= 1000:
-                logger.warning("Frame too large! Fragment index overlap risk.")
-                
-            chunk_id = frame_id * 1000 + i
-            result.append((chunk_id, packed_payload))
+            packed_payload = prefix + pack_index(i) + chunk_data
+            result.append((base_id + i, packed_payload))
             
         return result